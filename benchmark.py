@@ -0,0 +1,181 @@
+#!/usr/bin/python
+
+# Runs webfont.py against synthetic icon sets and writes results as JSON.
+# Options after "--" are passed to webfont.py, e.g.:
+#
+#   ./benchmark.py -s 100,1000 -o bench.json -- --jobs 4 --font-formats woff
+
+import sys
+import os
+import math
+import random
+import argparse
+import subprocess
+import tempfile
+import shutil
+import platform
+import json
+import time
+
+ROOT = os.path.abspath(os.path.dirname(__file__))
+
+SVG = """<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg" width="32" height="32" viewBox="0 0 32 32">
+{0}
+</svg>
+"""
+
+# closed path of segments curves around the icon center
+def make_path(rnd, segments, color):
+    cx, cy = rnd.uniform(10, 22), rnd.uniform(10, 22)
+    points = []
+    for i in range(segments * 3):
+        angle = 2 * math.pi * i / (segments * 3)
+        radius = rnd.uniform(3, 10)
+        points.append((cx + radius * math.cos(angle), cy + radius * math.sin(angle)))
+    d = ['M {0:.3f} {1:.3f}'.format(*points[0])]
+    for i in range(segments):
+        d.append('C ' + ' '.join('{0:.3f} {1:.3f}'.format(*points[(i * 3 + j) % len(points)])
+                                  for j in (1, 2, 3)))
+    d.append('Z')
+    style = ' fill="{0}"'.format(color) if color else ''
+    return '<path{0} d="{1}"/>'.format(style, ' '.join(d))
+
+# icon set in ICON_RE naming. Complexity varies from icon to icon, half of
+# icons are colored if colors is True
+def generate(folder, count, colors, seed=0):
+    rnd = random.Random(seed)
+    icons = os.path.join(folder, 'icons')
+    os.makedirs(icons)
+    # private use area doesn't fit large sets
+    base = 0xE000 if count <= 0x1900 else 0xF0000
+    for i in range(count):
+        segments = (4, 16, 64, 256)[i % 4]
+        color = '#{0:06x}'.format(rnd.randint(1, 0xffffff)) \
+            if colors and i % 2 == 0 else None
+        paths = [make_path(rnd, segments, color) for x in range(rnd.randint(1, 4))]
+        name = 'uni{0:04X}_icon-{1}.svg'.format(base + i, i)
+        with open(os.path.join(icons, name), 'w') as f:
+            f.write(SVG.format('\n'.join(paths)))
+    with open(os.path.join(folder, '.webfont.yml'), 'w') as f:
+        f.write('config:\n  output-dir: output\n')
+    os.makedirs(os.path.join(folder, 'output'))
+
+# interval of process tree memory sampling in seconds
+SAMPLE_INTERVAL = 0.05
+
+# summed RSS in KB of process and all its descendants, None if /proc is not
+# available
+def tree_rss(pid):
+    parents = {}
+    try:
+        for x in os.listdir('/proc'):
+            if not x.isdigit(): continue
+            try:
+                with open('/proc/{0}/stat'.format(x), 'r') as f:
+                    # command name can contain spaces, ppid follows it
+                    parents[int(x)] = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (IOError, IndexError, ValueError):
+                continue
+    except OSError:
+        return None
+    tree = set([pid])
+    added = True
+    while added:
+        children = set(x for x, ppid in parents.iteritems()
+                       if ppid in tree and x not in tree)
+        tree |= children
+        added = bool(children)
+    rss = 0
+    for x in tree:
+        try:
+            with open('/proc/{0}/status'.format(x), 'r') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'): rss += int(line.split()[1])
+        except (IOError, ValueError):
+            continue
+    return rss
+
+# runs webfont.py, returns wall time, peak RSS of webfont.py and its workers
+# together and phase timings. Concurrent workers RSS is summed by sampling
+# process tree, without /proc only the largest process peak is known
+def run(folder, args):
+    timings = os.path.join(folder, 'timings.json')
+    started = time.time()
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, 'webfont.py'),
+                             '-c', os.path.join(folder, '.webfont.yml'),
+                             '-T', timings] + args,
+                            stdout=open(os.devnull, 'w'))
+    peak = 0
+    while True:
+        pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+        if pid: break
+        peak = max(peak, tree_rss(proc.pid) or 0)
+        time.sleep(SAMPLE_INTERVAL)
+    wall = time.time() - started
+    if status != 0:
+        print('webfont.py failed in {0}'.format(folder))
+        exit(1)
+    with open(timings, 'r') as f:
+        phases = json.load(f)
+    return wall, max(peak, usage.ru_maxrss), phases
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=ROOT, stderr=open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == '__main__':
+    argv = sys.argv[1:]
+    webfont_args = []
+    if '--' in argv:
+        webfont_args = argv[argv.index('--') + 1:]
+        argv = argv[:argv.index('--')]
+    parser = argparse.ArgumentParser(description='Benchmark webfont.py on' +
+                                                 ' synthetic icon sets.')
+    parser.add_argument('-s', '--sizes',
+                        dest='sizes', default='100,1000,10000',
+                        help='comma separated icon set sizes' +
+                             ' (default: "100,1000,10000")')
+    parser.add_argument('--colors',
+                        dest='colors', default='both',
+                        choices=['both', 'yes', 'no'],
+                        help='benchmark icon sets with colors, without' +
+                             ' colors or both (default: both)')
+    parser.add_argument('-o', '--output',
+                        dest='output', default='benchmark.json',
+                        help='results file (default: benchmark.json)')
+    parser.add_argument('-k', '--keep',
+                        dest='keep', default=False, action='store_true',
+                        help='keep generated icon sets (default: False)')
+    options = vars(parser.parse_args(argv))
+
+    colors = {'both': [False, True], 'yes': [True], 'no': [False]}[options['colors']]
+    results = []
+    for size in [int(x) for x in options['sizes'].split(',')]:
+        for color in colors:
+            folder = tempfile.mkdtemp(prefix='webfont-bench-')
+            try:
+                generate(folder, size, color)
+                wall, rss, phases = run(folder, webfont_args)
+            finally:
+                if not options['keep']: shutil.rmtree(folder)
+            print('{0} icons{1}: {2:.2f}s, {3} KB peak RSS'.format(
+                size, ' with colors' if color else '', wall, rss))
+            results.append({
+                'icons': size,
+                'colors': color,
+                'wall': wall,
+                'peak-rss-kb': rss,
+                'phases': phases
+            })
+
+    with open(options['output'], 'w') as f:
+        json.dump({
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'args': webfont_args,
+            'results': results
+        }, f, indent=2, sort_keys=True)
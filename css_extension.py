@@ -1,5 +1,31 @@
 import os
+import re
 import string
+import base64
+
+REQUIRES = ['font']
+
+INLINE_FORMATS = ['woff2', 'woff']
+
+FONT_DISPLAY = ['auto', 'block', 'swap', 'fallback', 'optional']
+
+PRELOAD_TYPES = {
+    'woff2': 'font/woff2',
+    'woff': 'font/woff',
+    'ttf': 'font/ttf',
+    'otf': 'font/otf',
+    'eot': 'application/vnd.ms-fontobject'
+}
+
+# @font-face src order: font format, css format and url suffix
+CSS_FORMATS = [
+    ('woff2', 'woff2', ''),
+    ('woff', 'woff', ''),
+    ('eot', 'embedded-opentype', '?#iefix'),
+    ('otf', 'opentype', ''),
+    ('ttf', 'truetype', ''),
+    ('svg', 'svg', '')
+]
 
 COMMENTS = """/*
   This file is created automatically by webfont.py font generator
@@ -43,6 +69,32 @@ def get_options(parser):
                        help='font url template, use {fontname} placeholder' +
                             ' for font file name' +
                             ' (default: "url(/fonts/{fontname})")')
+    group.add_argument('--css-inline',
+                       dest='css-inline', choices=INLINE_FORMATS,
+                       help='embed font of given format into @font-face as' +
+                            ' base64 data uri (default: not embedded)')
+    group.add_argument('--css-inline-max-size',
+                       dest='css-inline-max-size', default=32768, type=int,
+                       help='fonts larger than this size in bytes are' +
+                            ' referenced by url (default: 32768)')
+    group.add_argument('--css-font-display',
+                       dest='css-font-display', choices=FONT_DISPLAY,
+                       help='font-display value of @font-face' +
+                            ' (default: not set)')
+    group.add_argument('--css-unicode-range',
+                       dest='css-unicode-range', default=False,
+                       action='store_true',
+                       help='add unicode-range of icons codes to @font-face' +
+                            ' (default: False)')
+    group.add_argument('--css-local',
+                       dest='css-local', default=[],
+                       help='comma separated names of locally installed fonts' +
+                            ' added as local() sources (default: none)')
+    group.add_argument('--css-preload',
+                       dest='css-preload', default=False, action='store_true',
+                       help='write <link rel=preload> html and Link header' +
+                            ' snippets for fonts next to css file' +
+                            ' (default: False)')
     group.add_argument('--css-aliases',
                        dest='css-aliases', default={},
                        help='css classes aliases in form' +
@@ -61,6 +113,14 @@ def parse_options(options, parser):
         options['css-class'] = ''.join([x for x in options['font-family'] if x in string.uppercase]).lower()
     if options['css-prefix'] is None:
         options['css-prefix'] = options['css-class'] + '-'
+    if options['css-inline'] not in [None] + INLINE_FORMATS:
+        parser.error('Unknown css-inline format: {0}'.format(options['css-inline']))
+    if options['css-font-display'] not in [None] + FONT_DISPLAY:
+        parser.error('Unknown css-font-display value: {0}'.format(
+            options['css-font-display']))
+    options['css-inline-max-size'] = int(options['css-inline-max-size'])
+    if isinstance(options['css-local'], basestring):
+        options['css-local'] = [x.strip() for x in options['css-local'].split(',') if x.strip()]
     if options['css-aliases'] is not None:
         if isinstance(options['css-aliases'], basestring):
             d = [map(str.strip, x.split(':', 2)) for x in options['css-aliases'].split(';') if ':' in x]
@@ -71,6 +131,8 @@ def init(options = {}, extensions = {}, **args):
         print 'css extension requires font extension'
         exit(1)
     options['_css'] = {}
+    # font builds written as @font-face into css-file
+    options['_css_font_faces'] = options['_font_builds'][:1]
 
 def get_names(icon = None):
     if icon is None: return []
@@ -84,39 +146,24 @@ def process(icon = None, **args):
     icon['options']['_css'][icon['name']] = icon['code']
     icon['names'] = get_names(icon = icon)
 
+def remove(icon = None, **args):
+    icon['options']['_css'].pop(icon['name'], None)
+
 def finish(options = {}, **args):
-    with open(options['css-file'], 'w') as css:
+    write_css(options, options['css-file'],
+              options['_css_font_faces'], options['_css'])
+    if options['css-preload']: write_preload(options, options['_css_font_faces'])
+
+# writes css with @font-face for given font builds and classes for icons
+# from codes dict (icon name: code)
+def write_css(options, path, builds, codes):
+    options['_outputs'].append(path)
+    with open(path, 'w') as css:
         css.write(COMMENTS)
         css.write('\n\n')
         if not options['css-skip-font-face']:
-            css.write('@font-face {\n')
-            css.write('  font-family: "{0}";\n'.format(options['font-family']))
-            css.write('  src: ')
-            css.write('\n\n')
-
-            fonts = []
-            if 'woff' in options['font-formats']:
-                fonts.append('{0} format(\'woff\')'.format(
-                    options['css-font-url'].format(
-                        fontname = options['font-family'] + '.woff')))
-            if 'eot' in options['font-formats']:
-                fonts.append('{0} format(\'embedded-opentype\')'.format(
-                    options['css-font-url'].format(
-                        fontname = options['font-family'] + '.eot?#iefix')))
-            if 'otf' in options['font-formats']:
-                fonts.append('{0} format(\'opentype\')'.format(
-                    options['css-font-url'].format(
-                        fontname = options['font-family'] + '.otf')))
-            if 'ttf' in options['font-formats']:
-                fonts.append('{0} format(\'truetype\')'.format(
-                    options['css-font-url'].format(
-                        fontname = options['font-family'] + '.ttf')))
-            if 'svg' in options['font-formats']:
-                fonts.append('{0} format(\'svg\')'.format(
-                    options['css-font-url'].format(
-                        fontname = options['font-family'] + '.svg#' +
-                                   options['font-family'])))
-            css.write(',\n       '.join(fonts) + ';\n}\n\n')
+            for build in builds:
+                css.write(get_font_face(options, build, codes))
 
         font_size = ''
         if options['css-font-size'] is not None:
@@ -124,10 +171,93 @@ def finish(options = {}, **args):
         css.write('.{0} {{{{{1}{2}}}}}\n\n'.format(
             options['css-class'], MAIN_CLASS, font_size
         ).format(options['font-family']))
-        for icon, code in options['_css'].iteritems():
+        # sorted by code, so unchanged icons give the same css
+        for icon, code in sorted(codes.iteritems(), key=lambda x: (x[1], x[0])):
             classes = ['.{0}{1}:before'.format(options['css-prefix'], icon)]
             if icon in options['css-aliases']:
                 classes += ['.{0}{1}:before'.format(options['css-prefix'], x)
                     for x in options['css-aliases'][icon]]
             css.write(', '.join(classes))
             css.write(' {{ content: "\\{:04x}"; }}\n'.format(code))
+
+# builds with 'unicode-range' set get unicode-range of their icons, so
+# browsers download only fonts with used glyphs. Only generated formats are
+# referenced when build has 'files'
+def get_font_face(options, build, codes={}):
+    files = build.get('files', {})
+    formats = files if 'files' in build else build['formats']
+    fonts = ['local("{0}")'.format(x) for x in options['css-local']]
+    for fmt, css_format, suffix in CSS_FORMATS:
+        if fmt not in formats: continue
+        if fmt == 'svg': suffix = '#' + options['font-family']
+        file = files.get(fmt, build['file'] + '.' + fmt)
+        url = None
+        if fmt == options['css-inline']: url = get_data_uri(options, file, fmt)
+        if url is None:
+            url = options['css-font-url'].format(fontname = file + suffix)
+        fonts.append('{0} format(\'{1}\')'.format(url, css_format))
+    descriptors = ''
+    if options['css-font-display'] is not None:
+        descriptors += '  font-display: {0};\n'.format(options['css-font-display'])
+    if build.get('unicode-range') or options['css-unicode-range']:
+        # empty unicode-range is invalid, so font without icons has none
+        ranges = get_unicode_range([v for k, v in codes.iteritems()
+                                      if build['names'] is None or k in build['names']])
+        if ranges: descriptors += '  unicode-range: {0};\n'.format(ranges)
+    return '@font-face {{\n  font-family: "{0}";\n  src: \n\n{1};\n{2}}}\n\n'.format(
+        options['font-family'], ',\n       '.join(fonts), descriptors)
+
+# font file as data uri, None if font is missing or larger than
+# css-inline-max-size
+def get_data_uri(options, file, fmt):
+    path = os.path.join(options['font-output'], file)
+    try:
+        if os.path.getsize(path) > options['css-inline-max-size']: return None
+        with open(path, 'rb') as f:
+            data = f.read()
+    except (IOError, OSError):
+        return None
+    return 'url(data:font/{0};base64,{1})'.format(fmt, base64.b64encode(data))
+
+# font url without url() wrapper
+def get_font_url(options, file):
+    url = options['css-font-url'].format(fontname = file)
+    m = re.match('^url\\(([\'"]?)(.*)\\1\\)$', url.strip())
+    return m.group(2) if m else url
+
+# preload hints for the first generated format of every font. Fonts with
+# unicode-range (shards) are loaded on demand and inlined fonts are not
+# requested, so they aren't preloaded
+def write_preload(options, builds):
+    links = []
+    for build in builds:
+        if build.get('unicode-range'): continue
+        formats = build.get('files', dict((x, build['file'] + '.' + x)
+                                          for x in build['formats']))
+        for fmt, css_format, suffix in CSS_FORMATS:
+            if fmt not in formats or fmt == 'svg': continue
+            if fmt != options['css-inline'] or \
+               get_data_uri(options, formats[fmt], fmt) is None:
+                links.append((get_font_url(options, formats[fmt]), PRELOAD_TYPES[fmt]))
+            break
+    path = os.path.splitext(options['css-file'])[0] + '.preload'
+    with open(path + '.html', 'w') as f:
+        for url, type in links:
+            f.write('<link rel="preload" href="{0}" as="font" type="{1}"' \
+                    ' crossorigin>\n'.format(url, type))
+    with open(path + '.headers', 'w') as f:
+        for url, type in links:
+            f.write('Link: <{0}>; rel=preload; as=font; type="{1}";' \
+                    ' crossorigin\n'.format(url, type))
+    options['_outputs'] += [path + '.html', path + '.headers']
+
+# codes collapsed into ranges: U+E000-E002, U+E005
+def get_unicode_range(codes):
+    ranges = []
+    for code in sorted(set(codes)):
+        if ranges and ranges[-1][1] == code - 1:
+            ranges[-1][1] = code
+        else:
+            ranges.append([code, code])
+    return ', '.join('U+{0:X}'.format(a) if a == b else 'U+{0:X}-{1:X}'.format(a, b)
+                     for a, b in ranges)
@@ -1,6 +1,8 @@
 import os
 import string
 
+REQUIRES = ['css', 'svg']
+
 COMMENTS = """/*
   This file is created automatically by webfont.py font generator
   WARNING! Don't change this file. Make changes in webfont config file instead
@@ -45,7 +47,7 @@ def parse_options(options, parser):
         options['css-vars-prefix'] = 'icon-'
     if options['css-vars-properties'] is not None:
         if isinstance(options['css-vars-properties'], basestring):
-            options['css-vars-properties'] = options['css-vars-properties'].split
+            options['css-vars-properties'] = options['css-vars-properties'].split()
     else:
         options['css-vars-properties'] = ['class']
 
@@ -72,10 +74,19 @@ def process(icon = None, extensions = {}, **args):
                 if color is not None: value = color.web
             set(icon, prop, value)
 
+def remove(icon = None, **args):
+    for prop in icon['options']['css-vars-properties']:
+        icon['options']['_css_vars'].pop('{0}{1}-{2}'.format(
+            icon['options']['css-vars-prefix'],
+            icon['name'],
+            prop
+        ), None)
+
 def finish(options = {}, **args):
+    options['_outputs'].append(options['css-vars-file'])
     with open(options['css-vars-file'], 'w') as css:
         css.write(COMMENTS)
         css.write('\n\n')
-        for k, v in options['_css_vars'].iteritems():
+        for k, v in sorted(options['_css_vars'].iteritems()):
             if v is None: continue
             css.write('${0}: {1};\n'.format(k, v))
@@ -0,0 +1,90 @@
+# Embedded OpenType (EOT) writer. EOT file is TrueType font data with header
+# filled from OS/2, head and name tables of the font, see
+# http://www.w3.org/Submission/EOT/
+
+import struct
+
+VERSION = 0x00020001
+MAGIC = 0x504C
+DEFAULT_CHARSET = 1
+
+# name ids of family, style, version and full names
+NAME_IDS = (1, 2, 5, 4)
+
+# table tag: (offset, length) from TrueType table directory
+def read_tables(data):
+    try:
+        count = struct.unpack_from('>H', data, 4)[0]
+        tables = {}
+        for i in range(count):
+            tag, checksum, offset, length = struct.unpack_from('>4sLLL', data, 12 + i * 16)
+            tables[tag] = (offset, length)
+    except struct.error:
+        raise ValueError('Invalid TrueType font')
+    for tag in ('OS/2', 'head', 'name'):
+        if tag not in tables: raise ValueError('Font has no {0} table'.format(tag))
+    return tables
+
+# names in UTF-16LE by name id. Windows unicode names are preferred, then
+# unicode and Macintosh roman names
+def read_names(data, offset):
+    count, strings = struct.unpack_from('>2xHH', data, offset)
+    names = {}
+    for i in range(count):
+        platform, encoding, language, name_id, length, start = \
+            struct.unpack_from('>6H', data, offset + 6 + i * 12)
+        if name_id not in NAME_IDS: continue
+        value = data[offset + strings + start:offset + strings + start + length]
+        if platform == 3 and encoding in (0, 1) and language == 0x409:
+            priority = 0
+        elif platform == 3 and encoding in (0, 1):
+            priority = 1
+        elif platform == 0:
+            priority = 2
+        elif platform == 1 and encoding == 0:
+            priority = 3
+            value = value.decode('mac_roman').encode('utf-16-be')
+        else:
+            continue
+        if name_id not in names or priority < names[name_id][0]:
+            names[name_id] = (priority, value.decode('utf-16-be').encode('utf-16-le'))
+    return dict((k, v[1]) for k, v in names.iteritems())
+
+# EOT header for TrueType font data
+def header(data):
+    tables = read_tables(data)
+    os2, os2_length = tables['OS/2']
+    weight = struct.unpack_from('>H', data, os2 + 4)[0]
+    fs_type = struct.unpack_from('>H', data, os2 + 8)[0]
+    panose = data[os2 + 32:os2 + 42]
+    unicode_range = struct.unpack_from('>4L', data, os2 + 42)
+    selection = struct.unpack_from('>H', data, os2 + 62)[0]
+    # code page ranges appeared in OS/2 version 1
+    code_page_range = (0, 0)
+    if struct.unpack_from('>H', data, os2)[0] >= 1 and os2_length >= 86:
+        code_page_range = struct.unpack_from('>2L', data, os2 + 78)
+    checksum_adjustment = struct.unpack_from('>L', data, tables['head'][0] + 8)[0]
+    names = read_names(data, tables['name'][0])
+
+    parts = [
+        None, # sizes are packed when header length is known
+        struct.pack('<LL', VERSION, 0),
+        panose,
+        struct.pack('<BBLHH', DEFAULT_CHARSET, selection & 1, weight, fs_type, MAGIC),
+        struct.pack('<4L', *unicode_range),
+        struct.pack('<2L', *code_page_range),
+        struct.pack('<L16x', checksum_adjustment)
+    ]
+    for name_id in NAME_IDS:
+        name = names.get(name_id, '')
+        parts.append(struct.pack('<HH', 0, len(name)) + name)
+    # padding and empty root string
+    parts.append(struct.pack('<HH', 0, 0))
+    size = sum(len(x) for x in parts[1:]) + 8
+    parts[0] = struct.pack('<LL', size + len(data), len(data))
+    return ''.join(parts)
+
+def write(data, path):
+    with open(path, 'wb') as f:
+        f.write(header(data))
+        f.write(data)
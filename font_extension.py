@@ -1,12 +1,35 @@
-import fontforge
-import cairo
-import rsvg
 import tempfile
 import StringIO
+import cPickle
+import xml.parsers.expat
+import hashlib
+import shutil
+import time
+import json
 import os
 import re
+import profiler
+import lazy
+import geometry
+import eot
+from tasks import run_tasks
 
-FORMATS = ['otf', 'ttf', 'eot', 'woff', 'svg', 'sfd']
+fontforge = lazy.module('fontforge')
+cairo = lazy.module('cairo')
+
+REQUIRES = ['svg']
+
+FORMATS = ['otf', 'ttf', 'eot', 'woff', 'woff2', 'svg', 'sfd']
+
+EM = 1000
+# fontforge default ascent for 1000 em, top of rendered icon is placed here
+ASCENT = 800
+
+# hex digits of content hash in font file names
+HASH_LENGTH = 10
+
+# bump this when the layout of cached glyphs changes
+CACHE_VERSION = 2
 
 def get_options(parser):
     group = parser.add_argument_group('font generation options')
@@ -30,27 +53,84 @@ def get_options(parser):
                        dest='sfd-output', default='',
                        help='SFD font output folder relative to work-dir' +
                             ' (default: work-dir itself)')
+    group.add_argument('--font-cache',
+                       dest='font-cache',
+                       help='glyph cache folder relative to work-dir' +
+                            ' (default: cache disabled)')
+    group.add_argument('--font-hash',
+                       dest='font-hash', default=False, action='store_true',
+                       help='add content hash to font file names and write' +
+                            ' {font-family}.manifest.json with hashed names' +
+                            ' (default: False)')
+    group.add_argument('--font-simplify',
+                       dest='font-simplify', type=float,
+                       help='simplify glyph outlines: merge redundant points' +
+                            ' and replace curves and lines deviating less' +
+                            ' than given tolerance in em/1000 units' +
+                            ' (default: disabled)')
+    group.add_argument('--font-grid',
+                       dest='font-grid', type=int,
+                       help='snap glyph points to grid of given units per em,' +
+                            ' e.g. 2048 for ttf (default: disabled)')
+    group.add_argument('--font-optimize-report',
+                       dest='font-optimize-report',
+                       help='write per-glyph points count and estimated size' +
+                            ' savings into JSON file (default: not written)')
+    group.add_argument('--font-dedupe',
+                       dest='font-dedupe', default=False, action='store_true',
+                       help='map codes of icons with identical sources or' +
+                            ' outlines to one glyph (default: False)')
+    group.add_argument('--css-only',
+                       dest='css-only', default=False, action='store_true',
+                       help='don\'t generate fonts, reuse glyphs recorded' +
+                            ' by previous build to regenerate css only' +
+                            ' (default: False)')
 
 def parse_options(options, parser):
     options['font-output'] = os.path.join(options['output-dir'], options['font-output'])
     options['sfd-output'] = os.path.join(options['work-dir'], options['sfd-output'])
+    if options['font-cache'] is not None:
+        options['font-cache'] = os.path.join(options['work-dir'], options['font-cache'])
 
     if options['font-family'] is None:
         options['font-family'] = ''.join(
             x.capitalize() or '_' for x in os.path.basename(
                 os.path.normpath(options['work-dir'])).split('_'))
 
+    if options['font-simplify'] is not None:
+        options['font-simplify'] = float(options['font-simplify'])
+        if options['font-simplify'] < 0:
+            parser.error('Invalid font-simplify tolerance: {0}'.format(
+                options['font-simplify']))
+    if options['font-grid'] is not None:
+        options['font-grid'] = int(options['font-grid'])
+        if options['font-grid'] < 1:
+            parser.error('Invalid font-grid: {0}'.format(options['font-grid']))
+
+    # glyphs of duplicates can't be updated separately from originals
+    if options['font-dedupe'] and options['watch']:
+        print('font-dedupe is ignored in watch mode')
+        options['font-dedupe'] = False
+
     if options['font-formats'] == 'all': options['font-formats'] = FORMATS
     if isinstance(options['font-formats'], basestring):
         options['font-formats'] = re.split('\W+', options['font-formats'])
     for fmt in options['font-formats']:
         if fmt not in FORMATS:
             parser.error('Wrong output font format: {0}'.format(fmt))
+    # generation runs in worker processes, so missing support is reported here
+    if 'woff2' in options['font-formats'] and not options['css-only'] and \
+       not woff2_supported():
+        parser.error('woff2 requires fontforge with woff2 support or' +
+                     ' fonttools with brotli')
 
-def init(options = {}, extensions = {}, **args):
+def init(options = {}, icons = [], extensions = {}, **args):
     if 'svg' not in extensions:
         print 'font extension requires svg extension'
         exit(1)
+    if options['css-only']:
+        init_css_only(options)
+        return
     options['_font'] = font = fontforge.font()
     font.copyright = options['font-copyright']
     font.familyname = options['font-family']
@@ -58,66 +138,634 @@ def init(options = {}, extensions = {}, **args):
     font.fontname = options['font-family']
     font.fullname = options['font-family']
     font.weight = str(options['font-weight'])
-    font.em = 1000
+    font.em = EM
+    options['_font_builds'] = []
+    add_build(options, options['font-family'])
+    # glyphs imported during this build, they are hinted in finish
+    options['_font_misses'] = []
+    options['_font_hits'] = 0
+    # optimized glyphs stats, name: (points before, after, bytes before, after)
+    options['_font_stats'] = {}
+    # duplicate name: (original name, code), originals by outline hash
+    options['_font_duplicates'] = {}
+    options['_font_outlines'] = {}
+    options['_font_names'] = {}
+    if options['font-dedupe']: find_duplicates(icons)
+    if options['font-cache'] is not None and \
+       not os.path.isdir(options['font-cache']):
+        os.makedirs(options['font-cache'])
+
+def prepare(icon=None, options={}, extensions={}, **args):
+    if options['css-only'] or 'duplicate' in icon: return None
+    result = {}
+    if options['font-cache'] is not None:
+        result['key'] = cache_key(extensions['svg'].get_document(icon).data,
+                                  options)
+        data = read_cache(result['key'], options)
+        if data is not None:
+            result['cached'] = data
+            return result
+    with profiler.measure(options, 'cairo.render'):
+        result['outlines'] = render(icon, extensions)
+    if optimized(options) and not isinstance(result['outlines'][0], basestring):
+        contours, width, height = result['outlines']
+        contours, result['stats'] = optimize(contours, options)
+        result['outlines'] = contours, width, height
+    # cached glyphs always have outline hash, so dedupe works with cache
+    # filled by builds without it
+    if options['font-dedupe'] or options['font-cache'] is not None:
+        result['outline'] = outline_hash(result['outlines'])
+    return result
 
 def process(icon=None, extensions={}, **args):
-    if icon is None or 'svg' not in icon: return
-    if icon['options']['debug']:
+    if icon is None or 'code' not in icon: return
+    options = icon['options']
+    if options['css-only']:
+        if icon['name'] not in options['_font_glyphs']:
+            print('icon {0} is not in font, run full build'.format(icon['name']))
+        return
+    if options['debug']:
         print('processing icon {0}'.format(icon['name']))
 
-    width = icon['svg'].props.width
-    height = icon['svg'].props.height
+    if 'duplicate' in icon:
+        add_duplicate(options, icon, icon['duplicate'])
+        return
+    prepared = icon.get('prepared', {}).get('font')
+    if prepared is None:
+        prepared = prepare(icon=icon, options=options, extensions=extensions)
+    outline = prepared.get('outline') or prepared.get('cached', {}).get('outline')
+    if options['font-dedupe'] and outline is not None:
+        if outline in options['_font_outlines']:
+            add_duplicate(options, icon, options['_font_outlines'][outline])
+            return
+        options['_font_outlines'][outline] = icon['name']
+    glyph = options['_font'].createChar(
+        icon['code'],
+        'uni{:04X}'.format(icon['code'])
+    )
+    glyph.comment = icon['name']
+    options['_font_names'][icon['name']] = glyph.glyphname
+    if 'cached' in prepared:
+        with profiler.measure(options, 'fontforge.restoreGlyph'):
+            restore_glyph(glyph, prepared['cached'])
+        if prepared['cached'].get('stats') is not None:
+            options['_font_stats'][icon['name']] = prepared['cached']['stats']
+        options['_font_hits'] += 1
+        return
+    with profiler.measure(options, 'fontforge.importGlyph'):
+        import_glyph(glyph, *prepared['outlines'])
+    stats = prepared.get('stats')
+    if optimized(options) and isinstance(prepared['outlines'][0], basestring):
+        with profiler.measure(options, 'fontforge.simplify'):
+            stats = optimize_glyph(glyph, options)
+    if stats is not None: options['_font_stats'][icon['name']] = stats
+    options['_font_misses'].append((glyph, prepared.get('key'),
+                                    prepared.get('outline')))
+
+# renders icon with cairo, returns glyph contours (or svg data without colors
+# if icon can't be converted in memory) and icon size
+def render(icon, extensions):
+    svg = extensions['svg'].get_document(icon).handle
+    width = svg.props.width
+    height = svg.props.height
     px2pt = 1 / 1.25
-    scale = 1000.0 / height
-    with tempfile.NamedTemporaryFile(suffix='.svg') as tmp:
-        # render icon into temporary buffer
-        svg = rsvg.Handle(file=icon['file'])
-        buf = StringIO.StringIO()
-        surface = cairo.SVGSurface(buf, scale * width * px2pt, 1000 * px2pt)
-        ctx = cairo.Context(surface)
-        # scale icon to have height 1000px
-        ctx.scale(scale * px2pt, scale * px2pt)
-        svg.render_cairo(ctx)
-        surface.finish()
-        buf.seek(0)
-        # extract color information from icon and save it into tmp file
-        dom = extensions['svg'].extract_styles(file=buf, styles=['colors'])
-        tmp.write(dom.toxml().encode('utf-8'))
-        tmp.seek(0)
-        # import icon into font
-        glyph = icon['options']['_font'].createChar(
-            icon['code'],
-            'uni{:04X}'.format(icon['code'])
-        )
-        glyph.importOutlines(tmp.name)
-        glyph.addExtrema()
-        glyph.comment = icon['name']
-        glyph.width = width * scale
-        glyph.vwidth = height * scale
-
-def finish(options = {}, **args):
+    scale = float(EM) / height
+    # render icon into temporary buffer
+    buf = StringIO.StringIO()
+    surface = cairo.SVGSurface(buf, scale * width * px2pt, EM * px2pt)
+    ctx = cairo.Context(surface)
+    # scale icon to have height 1000px
+    ctx.scale(scale * px2pt, scale * px2pt)
+    svg.render_cairo(ctx)
+    surface.finish()
+    contours = parse_outlines(buf.getvalue())
+    if contours is not None: return contours, width, height
+    # extract color information from icon
+    return extensions['svg'].scan(buf.getvalue(), strip=['colors'])[1], width, height
+
+def import_glyph(glyph, outlines, width, height):
+    scale = float(EM) / height
+    if isinstance(outlines, basestring):
+        # fallback for icons with clipping, images, text etc.
+        with tempfile.NamedTemporaryFile(suffix='.svg') as tmp:
+            tmp.write(outlines)
+            tmp.seek(0)
+            glyph.importOutlines(tmp.name)
+    else:
+        draw_outlines(glyph, outlines)
+    glyph.addExtrema()
+    glyph.width = width * scale
+    glyph.vwidth = height * scale
+
+# duplicates
+
+# marks icons with the same source as earlier icon, their prepare and import
+# are skipped
+def find_duplicates(icons):
+    originals = {}
+    for icon in icons:
+        if 'code' not in icon or 'font' not in icon['extensions']: continue
+        with open(icon['file'], 'rb') as f:
+            digest = hashlib.sha1(f.read()).digest()
+        if digest in originals:
+            icon['duplicate'] = originals[digest]
+        else:
+            originals[digest] = icon['name']
+
+# outlines hash, coordinates are rounded to ignore float noise
+def outline_hash(outlines):
+    outlines, width, height = outlines
+    key = hashlib.sha1(repr(round(float(width) / height, 6)))
+    if isinstance(outlines, basestring):
+        key.update(outlines)
+    else:
+        for contour in geometry.points(outlines):
+            key.update(repr([(round(x, 2), round(y, 2)) for x, y in contour]))
+    return key.hexdigest()
+
+# maps icon code to glyph of original icon. Source duplicate can point to
+# icon which is an outline duplicate itself, so original is resolved first
+def add_duplicate(options, icon, original):
+    if original in options['_font_duplicates']:
+        original = options['_font_duplicates'][original][0]
+    name = options['_font_names'][original]
+    glyph = options['_font'][name]
+    glyph.altuni = (glyph.altuni or ()) + ((icon['code'], -1, 0),)
+    options['_font_names'][icon['name']] = name
+    options['_font_duplicates'][icon['name']] = (original, icon['code'])
+
+def print_duplicates(options):
+    duplicates = options['_font_duplicates']
+    if not duplicates: return
+    print('duplicates: {0} ({1})'.format(len(duplicates), ', '.join(
+        '{0} = {1}'.format(k, v[0]) for k, v in sorted(duplicates.iteritems()))))
+
+# outlines optimization
+
+def optimized(options):
+    return options['font-simplify'] is not None or options['font-grid'] is not None
+
+# grid step in em/1000 units, size estimation uses em units without grid
+def _grid_step(options):
+    return float(EM) / options['font-grid'] if options['font-grid'] else 1.0
+
+# optimizes parsed contours, returns them with stats
+def optimize(contours, options):
+    step = _grid_step(options)
+    before = geometry.points(contours)
+    if options['font-grid'] is not None:
+        contours = geometry.snap(contours, step)
+    contours = geometry.simplify(contours, options['font-simplify'] or 0.0)
+    return contours, geometry.stats(before, geometry.points(contours), step)
+
+# optimizes imported glyph with fontforge for icons which can't be parsed
+def optimize_glyph(glyph, options):
+    step = _grid_step(options)
+    before = [[(p.x, p.y) for p in c] for c in glyph.foreground]
+    if options['font-simplify'] is not None:
+        glyph.simplify(options['font-simplify'], ('mergelines',))
+    if options['font-grid'] is not None:
+        glyph.round(options['font-grid'] / float(EM))
+    after = [[(p.x, p.y) for p in c] for c in glyph.foreground]
+    return geometry.stats(before, after, step)
+
+def write_optimize_report(options):
+    stats = options['_font_stats'].values()
+    if not stats: return
+    totals = [sum(x[i] for x in stats) for i in range(4)]
+    print('outlines: {0} -> {1} points, ~{2} -> ~{3} bytes'.format(*totals))
+    if options['font-optimize-report'] is None: return
+    report = dict((name, {
+        'points': [x[0], x[1]],
+        'bytes': [x[2], x[3]]
+    }) for name, x in options['_font_stats'].iteritems())
+    with open(options['font-optimize-report'], 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+def draw_outlines(glyph, contours):
+    pen = glyph.glyphPen()
+    for contour in contours:
+        pen.moveTo(contour[0])
+        for segment in contour[1:]:
+            if len(segment) == 1:
+                pen.lineTo(segment[0])
+            else:
+                pen.curveTo(*segment)
+        pen.closePath()
+    pen = None # outlines are added to glyph when pen is released
+
+# in-memory outlines import
+
+class _Unsupported(Exception):
+    pass
+
+PATH_TOKEN_RE = re.compile('[A-Za-z]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+TRANSFORM_RE = re.compile('(matrix|translate|scale)\s*\(([^)]*)\)')
+
+# converts cairo rendered SVG into list of contours in glyph coordinates the
+# same way fontforge SVG import does: viewBox height is scaled to em and Y
+# axis is flipped. Every contour is [start, segment, ...] where segment is
+# (point,) for lines and (control1, control2, point) for curves. Returns
+# None if SVG contains anything except plain paths
+def parse_outlines(data):
+    contours = []
+    stack = []
+    def start(name, attrs):
+        if name == 'svg':
+            x, y, w, h = map(float, attrs['viewBox'].replace(',', ' ').split())
+            scale = float(EM) / h
+            stack.append((scale, 0, 0, -scale, -x * scale, ASCENT + y * scale))
+        elif name in ('g', 'path') and stack:
+            matrix = stack[-1]
+            if 'transform' in attrs:
+                matrix = _multiply(matrix, _parse_transform(attrs['transform']))
+            stack.append(matrix)
+            if name == 'path':
+                contours.extend(_parse_path(attrs.get('d', ''), matrix))
+        else:
+            raise _Unsupported(name)
+    def end(name):
+        stack.pop()
+    parser = xml.parsers.expat.ParserCreate()
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    try:
+        parser.Parse(data, True)
+    except (_Unsupported, KeyError, ValueError, IndexError,
+            xml.parsers.expat.ExpatError):
+        return None
+    return contours
+
+def _multiply(m, t):
+    return (m[0] * t[0] + m[2] * t[1], m[1] * t[0] + m[3] * t[1],
+            m[0] * t[2] + m[2] * t[3], m[1] * t[2] + m[3] * t[3],
+            m[0] * t[4] + m[2] * t[5] + m[4], m[1] * t[4] + m[3] * t[5] + m[5])
+
+def _parse_transform(value):
+    matrix = (1, 0, 0, 1, 0, 0)
+    for name, args in TRANSFORM_RE.findall(value):
+        args = map(float, args.replace(',', ' ').split())
+        if name == 'matrix' and len(args) == 6:
+            t = tuple(args)
+        elif name == 'translate' and len(args) in (1, 2):
+            t = (1, 0, 0, 1, args[0], args[1] if len(args) == 2 else 0)
+        elif name == 'scale' and len(args) in (1, 2):
+            t = (args[0], 0, 0, args[-1], 0, 0)
+        else:
+            raise _Unsupported(name)
+        matrix = _multiply(matrix, t)
+    if TRANSFORM_RE.sub('', value).strip(' ,'): raise _Unsupported(value)
+    return matrix
+
+# cairo writes absolute M, L, C and Z commands only
+def _parse_path(d, m):
+    def point(x, y):
+        x, y = float(x), float(y)
+        return (m[0] * x + m[2] * y + m[4], m[1] * x + m[3] * y + m[5])
+    contours = []
+    contour = None
+    tokens = PATH_TOKEN_RE.findall(d)
+    i = 0
+    while i < len(tokens):
+        cmd = tokens[i]
+        if cmd == 'M':
+            contour = [point(tokens[i + 1], tokens[i + 2])]
+            contours.append(contour)
+            i += 3
+        elif cmd == 'L' and contour is not None:
+            contour.append((point(tokens[i + 1], tokens[i + 2]),))
+            i += 3
+        elif cmd == 'C' and contour is not None:
+            contour.append((point(tokens[i + 1], tokens[i + 2]),
+                            point(tokens[i + 3], tokens[i + 4]),
+                            point(tokens[i + 5], tokens[i + 6])))
+            i += 7
+        elif cmd == 'Z' and contour is not None:
+            # closing line is added by pen
+            if len(contour) > 1 and contour[-1] == (contour[0],):
+                contour.pop()
+            contour = None
+            i += 1
+        else:
+            raise _Unsupported(cmd)
+    # filled paths are closed, contours without segments are dropped
+    return [x for x in contours if len(x) > 1]
+
+def finish(options = {}, icons = [], **args):
+    if options['css-only']: return
     font = options['_font']
-    font.autoHint()
-    font.correctDirection()
-    font.removeOverlap()
-    if 'otf' in options['font-formats']:
-        font.generate(os.path.join(options['font-output'], options['font-family'] + '.otf'))
-    if 'woff' in options['font-formats']:
-        font.generate(os.path.join(options['font-output'], options['font-family'] + '.woff'))
-    if 'svg' in options['font-formats']:
-        font.generate(os.path.join(options['font-output'], options['font-family'] + '.svg'))
+    # glyphs restored from cache are already hinted and cleaned up
+    font.selection.none()
+    for glyph, key, outline in options['_font_misses']:
+        font.selection.select(('more',), glyph.glyphname)
+    with profiler.measure(options, 'fontforge.autoHint'):
+        font.autoHint()
+    with profiler.measure(options, 'fontforge.correctDirection'):
+        font.correctDirection()
+    with profiler.measure(options, 'fontforge.removeOverlap'):
+        font.removeOverlap()
+    if options['font-cache'] is not None:
+        for glyph, key, outline in options['_font_misses']:
+            save_glyph(glyph, key, options,
+                       options['_font_stats'].get(glyph.comment), outline)
+        print('glyph cache: {0} hits, {1} misses'.format(
+            options['_font_hits'], len(options['_font_misses'])))
+    # canonical SFD, every output font is generated from it
+    tmp_dir = None
     if 'sfd' in options['font-formats']:
-        font.save(os.path.join(options['sfd-output'], options['font-family'] + '.sfd'))
-    if 'ttf' in options['font-formats'] or 'eot' in options['font-formats']:
-        font.em = 2048
-        font.round() # ttf requires integer points
-        ttf_path = os.path.join(options['font-output'], options['font-family'] + '.ttf')
-        font.generate(ttf_path)
-        if 'eot' in options['font-formats']:
-            os.system('{0} < {1} > {2}'.format(
-                os.path.join(options['root'], 'ttf2eot'),
-                ttf_path,
-                os.path.join(options['font-output'], options['font-family'] + '.eot')
-            ))
-        if 'ttf' not in options['font-formats']: os.remove(ttf_path)
-    font.close()
+        sfd = os.path.join(options['sfd-output'], options['font-family'] + '.sfd')
+    else:
+        tmp_dir = tempfile.mkdtemp()
+        sfd = os.path.join(tmp_dir, options['font-family'] + '.sfd')
+    # fonts should be byte-identical for unchanged icons to have stable
+    # hashes. Environment is restored, so later builds in the same process
+    # are not affected
+    epoch = os.environ.get('SOURCE_DATE_EPOCH')
+    if options['font-hash'] and epoch is None: os.environ['SOURCE_DATE_EPOCH'] = '0'
+    try:
+        started = time.time()
+        font.save(sfd)
+        glyphs = get_glyphs(font)
+        for name, (original, code) in options['_font_duplicates'].iteritems():
+            glyphs[name] = dict(glyphs[original], code=code)
+        # glyphs of the last build are kept the same way as in css-only mode
+        options['_font_glyphs'] = glyphs
+        # font is kept in watch mode for incremental rebuilds
+        if not options['watch']: options.pop('_font').close()
+        saved = time.time() - started
+        timings = generate_fonts(sfd, get_builds(options, icons), options)
+    finally:
+        if epoch is None: os.environ.pop('SOURCE_DATE_EPOCH', None)
+        if tmp_dir is not None: shutil.rmtree(tmp_dir)
+    # formats which were not generated are not referenced by css
+    generated = set(name for name, t in timings)
+    for build in options['_font_builds']:
+        build['files'] = dict((fmt, build['file'] + '.' + fmt)
+                                for fmt in build['formats']
+                                    if build['file'] + '.' + fmt in generated)
+    if options['font-hash']: fingerprint(options)
+    save_meta(options, glyphs)
+    if tmp_dir is None: options['_outputs'].append(sfd)
+    options['_outputs'].extend(os.path.join(options['font-output'], x)
+                               for build in options['_font_builds']
+                                   for x in sorted(build['files'].itervalues()))
+    if options['_profiler'] is not None:
+        options['_profiler'].add('fontforge.save', saved)
+        # generation may run in worker processes, so its timings are reported
+        for name, t in timings:
+            options['_profiler'].add('fontforge.generate', t)
+    if tmp_dir is None: timings.insert(0, (os.path.basename(sfd), saved))
+    print('fonts: {0}'.format(', '.join(
+        '{0} {1:.2f}s'.format(name, t) for name, t in timings)))
+    if optimized(options): write_optimize_report(options)
+    print_duplicates(options)
+    options['_font_misses'] = []
+    options['_font_hits'] = 0
+    options['_font_stats'] = {}
+
+# fonts generated in finish. Main font is always generated, other extensions
+# can add more builds in init. Build is dict with 'file' - output file name
+# without extension, 'names' - names of included icons (None for all icons)
+# and 'formats' - output formats
+def add_build(options, file, names=None, formats=None):
+    if options['css-only']:
+        for build in options['_font_builds']:
+            if build['file'] == file:
+                build['names'] = names
+                return build
+        print('font {0} was not generated by previous build'.format(file))
+    if formats is None:
+        formats = [x for x in options['font-formats'] if x != 'sfd']
+    build = { 'file': file, 'names': names, 'formats': formats }
+    options['_font_builds'].append(build)
+    return build
+
+# builds with codes of included icons
+def get_builds(options, icons):
+    builds = []
+    for build in options['_font_builds']:
+        build = dict(build)
+        if build['names'] is not None:
+            build['codes'] = sorted(x['code'] for x in icons
+                                    if 'code' in x and x['name'] in build['names'])
+        else:
+            build['codes'] = None
+        builds.append(build)
+    return builds
+
+def remove(icon=None, **args):
+    if icon is None or 'code' not in icon or icon['options']['css-only']: return
+    font = icon['options']['_font']
+    name = 'uni{:04X}'.format(icon['code'])
+    if name in font: font.removeGlyph(name)
+
+# font is closed in finish unless it is kept for watch mode
+def close(options = {}, **args):
+    if '_font' in options: options.pop('_font').close()
+
+# glyphs and builds of last build are recorded, so css can be regenerated
+# without fontforge
+def _meta_path(options):
+    return os.path.join(options['sfd-output'], options['font-family'] + '.webfont.json')
+
+def get_glyphs(font):
+    return dict((glyph.comment, {
+        'code': glyph.unicode,
+        'width': glyph.width,
+        'vwidth': glyph.vwidth,
+        'points': sum(len(x) for x in glyph.foreground)
+    }) for glyph in font.glyphs() if glyph.unicode != -1)
+
+def save_meta(options, glyphs):
+    builds = [dict((k, v) for k, v in x.iteritems() if k != 'names')
+                for x in options['_font_builds']]
+    with open(_meta_path(options), 'w') as f:
+        json.dump({ 'glyphs': glyphs, 'builds': builds }, f,
+                  indent=2, sort_keys=True)
+    options['_outputs'].append(_meta_path(options))
+
+def init_css_only(options):
+    try:
+        with open(_meta_path(options), 'r') as f:
+            meta = json.load(f)
+    except IOError:
+        print('{0} not found, run full build first'.format(_meta_path(options)))
+        exit(1)
+    options['_font_glyphs'] = meta['glyphs']
+    options['_font_builds'] = [dict(x, names=None) for x in meta['builds']]
+
+# renames generated fonts to name.hash.ext and writes manifest with logical
+# and hashed file names. Build 'files' are updated with hashed names
+def fingerprint(options):
+    manifest = {}
+    for build in options['_font_builds']:
+        for fmt, name in sorted(build['files'].items()):
+            path = os.path.join(options['font-output'], name)
+            with open(path, 'rb') as f:
+                digest = hashlib.sha1(f.read()).hexdigest()[:HASH_LENGTH]
+            hashed = '{0}.{1}.{2}'.format(build['file'], digest, fmt)
+            os.rename(path, os.path.join(options['font-output'], hashed))
+            build['files'][fmt] = manifest[name] = hashed
+    path = os.path.join(options['font-output'],
+                        options['font-family'] + '.manifest.json')
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    options['_outputs'].append(path)
+
+# generates builds from SFD file. Each format is built from its own font
+# instance, in worker processes if jobs option is set. Returns list of
+# generated files with generation time
+def generate_fonts(sfd, builds, options):
+    tasks = []
+    for build in builds:
+        task = (sfd, build['file'], build['codes'], options['font-output'])
+        # eot is converted from ttf so they are generated together
+        ttf = [fmt for fmt in ('ttf', 'eot') if fmt in build['formats']]
+        if ttf: tasks.append(task + (ttf,))
+        tasks += [task + ([fmt],) for fmt in FORMATS
+                    if fmt in build['formats'] and fmt in ('otf', 'woff', 'woff2', 'svg')]
+    results = run_tasks(generate, tasks, options['jobs'])
+    return [x for y in results for x in y]
+
+def generate(task):
+    sfd, file, codes, output, formats = task
+    timings = []
+    started = time.time()
+    font = fontforge.open(sfd)
+    try:
+        if codes is not None:
+            codes = set(codes)
+            for glyph in list(font.glyphs()):
+                if glyph.unicode == -1: continue
+                # codes of duplicates are alternate unicodes of their glyphs
+                alt = [x for x in glyph.altuni or () if x[0] in codes]
+                if glyph.unicode not in codes:
+                    if not alt:
+                        font.removeGlyph(glyph)
+                        continue
+                    glyph.unicode = alt.pop(0)[0]
+                if glyph.altuni: glyph.altuni = tuple(alt) or None
+        if formats[0] in ('ttf', 'eot'):
+            font.em = 2048
+            font.round() # ttf requires integer points
+            # fontforge writes fonts into files only
+            if 'ttf' in formats:
+                ttf_path = os.path.join(output, file + '.ttf')
+            else:
+                fd, ttf_path = tempfile.mkstemp(suffix='.ttf')
+                os.close(fd)
+            try:
+                font.generate(ttf_path)
+                if 'ttf' in formats:
+                    timings.append((file + '.ttf', time.time() - started))
+                if 'eot' in formats:
+                    started = time.time()
+                    with open(ttf_path, 'rb') as f:
+                        eot.write(f.read(), os.path.join(output, file + '.eot'))
+                    timings.append((file + '.eot', time.time() - started))
+            finally:
+                if 'ttf' not in formats: os.remove(ttf_path)
+        elif formats[0] == 'woff2':
+            generate_woff2(font, os.path.join(output, file + '.woff2'))
+            timings.append((file + '.woff2', time.time() - started))
+        else:
+            font.generate(os.path.join(output, file + '.' + formats[0]))
+            timings.append((file + '.' + formats[0], time.time() - started))
+    finally:
+        font.close()
+    return timings
+
+# fontforge writes woff2 when it is built with libwoff2, otherwise font is
+# compressed with fontTools (requires brotli module)
+def woff2_supported():
+    try:
+        from fontTools.ttLib import woff2
+        import brotli
+        return True
+    except ImportError:
+        pass
+    tmp_dir = tempfile.mkdtemp()
+    font = fontforge.font()
+    try:
+        font.generate(os.path.join(tmp_dir, 'test.woff2'))
+        return True
+    except (EnvironmentError, TypeError):
+        return False
+    finally:
+        font.close()
+        shutil.rmtree(tmp_dir)
+
+def generate_woff2(font, path):
+    try:
+        font.generate(path)
+        return
+    except (EnvironmentError, TypeError):
+        pass
+    # runs in worker processes where exit would hang the pool, support is
+    # checked in parse_options
+    try:
+        from fontTools.ttLib import woff2
+    except ImportError:
+        raise RuntimeError('woff2 requires fontforge with woff2 support or' +
+                           ' fonttools with brotli')
+    ttf_path = path + '.ttf'
+    font.generate(ttf_path)
+    try:
+        woff2.compress(ttf_path, path)
+    finally:
+        os.remove(ttf_path)
+
+# glyph cache
+
+def cache_key(data, options):
+    key = hashlib.sha1()
+    key.update('{0}:{1}:{2}:{3}:{4}\0'.format(CACHE_VERSION,
+                                               options['font-weight'],
+                                               EM,
+                                               options['font-simplify'],
+                                               options['font-grid']))
+    key.update(data)
+    return key.hexdigest()
+
+def _cache_path(key, options):
+    return os.path.join(options['font-cache'], key + '.glyph')
+
+def read_cache(key, options):
+    try:
+        with open(_cache_path(key, options), 'rb') as f:
+            return cPickle.load(f)
+    except (IOError, EOFError, cPickle.UnpicklingError):
+        return None
+
+def restore_glyph(glyph, data):
+    layer = fontforge.layer()
+    for quadratic, closed, points in data['contours']:
+        contour = fontforge.contour()
+        contour.is_quadratic = quadratic
+        for x, y, on_curve in points:
+            contour += fontforge.point(x, y, on_curve)
+        contour.closed = closed
+        layer += contour
+    glyph.foreground = layer
+    glyph.width = data['width']
+    glyph.vwidth = data['vwidth']
+    glyph.hhints = data['hhints']
+    glyph.vhints = data['vhints']
+
+def save_glyph(glyph, key, options, stats=None, outline=None):
+    data = {
+        'contours': [(c.is_quadratic, c.closed,
+                      [(p.x, p.y, p.on_curve) for p in c])
+                     for c in glyph.foreground],
+        'width': glyph.width,
+        'vwidth': glyph.vwidth,
+        'hhints': glyph.hhints,
+        'vhints': glyph.vhints,
+        'stats': stats,
+        'outline': outline
+    }
+    path = _cache_path(key, options)
+    # write through temporary file so interrupted builds leave no broken entries
+    with open(path + '.tmp', 'wb') as f:
+        cPickle.dump(data, f, cPickle.HIGHEST_PROTOCOL)
+    os.rename(path + '.tmp', path)
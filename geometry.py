@@ -0,0 +1,91 @@
+# Glyph outlines optimization. Contours are lists [start, segment, ...] where
+# segment is (point,) for lines and (control1, control2, point) for curves,
+# contour is closed with line from the last point to start
+
+import math
+
+# snaps all points to grid with given step
+def snap(contours, step):
+    def point(p):
+        return (round(p[0] / step) * step, round(p[1] / step) * step)
+    return [[point(contour[0])] + [tuple(point(p) for p in segment)
+                                   for segment in contour[1:]]
+            for contour in contours]
+
+# removes zero length segments, replaces flat curves with lines and merges
+# lines which deviate from straight line less than tolerance. Points are never
+# moved, so snapped contours stay on grid
+def simplify(contours, tolerance):
+    result = []
+    for contour in contours:
+        contour = _simplify_contour(contour, tolerance)
+        # contours without area are dropped
+        if len(contour) > 2 or (len(contour) == 2 and len(contour[1]) == 3):
+            result.append(contour)
+    return result
+
+def _simplify_contour(contour, tolerance):
+    start = contour[0]
+    segments = []
+    # points removed from every kept segment, they must stay close to it
+    merged = []
+    for segment in contour[1:]:
+        prev = segments[-1][-1] if segments else start
+        if len(segment) == 3 and \
+           _distance(segment[0], prev, segment[2]) <= tolerance and \
+           _distance(segment[1], prev, segment[2]) <= tolerance:
+            segment = (segment[2],)
+        if all(p == prev for p in segment): continue
+        if len(segment) == 1 and segments and len(segments[-1]) == 1:
+            before = segments[-2][-1] if len(segments) > 1 else start
+            if all(_distance(p, before, segment[0]) <= tolerance
+                   for p in merged[-1] + [prev]):
+                merged[-1].append(prev)
+                segments[-1] = segment
+                continue
+        segments.append(segment)
+        merged.append([])
+    # lines ending on the closing line
+    while segments and len(segments[-1]) == 1:
+        before = segments[-2][-1] if len(segments) > 1 else start
+        removed = merged[-1] + [segments[-1][0]]
+        if not all(_distance(p, before, start) <= tolerance for p in removed):
+            break
+        segments.pop()
+        merged.pop()
+        if merged: merged[-1] += removed
+    return [start] + segments
+
+# distance from point p to segment ab
+def _distance(p, a, b):
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    length = float(dx * dx + dy * dy)
+    t = 0.0
+    if length > 0:
+        t = max(0.0, min(1.0, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / length))
+    return math.hypot(p[0] - a[0] - t * dx, p[1] - a[1] - t * dy)
+
+# contours as lists of on-curve and off-curve points
+def points(contours):
+    return [[contour[0]] + [p for segment in contour[1:] for p in segment]
+            for contour in contours]
+
+# estimated glyph data size like in TrueType glyf table: flag byte and one
+# or two bytes for every non-zero coordinate delta in units of given step
+def estimate_bytes(points, step):
+    size = 0
+    last = (0, 0)
+    for contour in points:
+        size += 2 # end point index
+        for p in contour:
+            p = (int(round(p[0] / step)), int(round(p[1] / step)))
+            for delta in (p[0] - last[0], p[1] - last[1]):
+                if delta: size += 1 if abs(delta) < 256 else 2
+            size += 1
+            last = p
+    return size
+
+# points count and estimated size of contours before and after optimization
+def stats(before, after, step):
+    return (sum(len(x) for x in before), sum(len(x) for x in after),
+            estimate_bytes(before, step), estimate_bytes(after, step))
@@ -0,0 +1,24 @@
+import importlib
+
+# module proxy which imports module on first attribute access. Extensions
+# declare heavy dependencies with it, so they are loaded only when a hook
+# actually uses them:
+#
+#   fontforge = lazy.module('fontforge')
+class LazyModule(object):
+    def __init__(self, name):
+        self.__name__ = name
+
+    # called only for attributes missing on proxy. Module attributes are
+    # copied into proxy after import, so later accesses are plain lookups
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        self.__dict__['__name__'] = module.__name__
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return '<lazy module {0!r}>'.format(self.__name__)
+
+def module(name):
+    return LazyModule(name)
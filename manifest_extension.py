@@ -0,0 +1,97 @@
+import hashlib
+import json
+import time
+import os
+import re
+
+# runs after all extensions writing outputs
+REQUIRES = ['font', 'css', 'css_vars', 'subset', 'shard', 'sprite', 'precompress']
+
+def get_options(parser):
+    group = parser.add_argument_group('build manifest options')
+    group.add_argument('--manifest-file',
+                       dest='manifest-file', default='webfont-build.json',
+                       help='build manifest file relative to output-dir' +
+                            ' (default: "webfont-build.json")')
+    group.add_argument('--budget-font-bytes',
+                       dest='budget-font-bytes', default={},
+                       help='max size of every generated font by format in' +
+                            ' form "woff: 30000; woff2: 20000"' +
+                            ' (default: no limits)')
+    group.add_argument('--budget-glyph-points',
+                       dest='budget-glyph-points', type=int,
+                       help='max points in every glyph (default: no limit)')
+    group.add_argument('--budget-seconds',
+                       dest='budget-seconds', type=float,
+                       help='max build time in seconds (default: no limit)')
+
+def parse_options(options, parser):
+    options['manifest-file'] = os.path.join(options['output-dir'], options['manifest-file'])
+    if isinstance(options['budget-font-bytes'], basestring):
+        d = [map(str.strip, x.split(':', 2))
+             for x in re.split('[;,]', options['budget-font-bytes']) if ':' in x]
+        options['budget-font-bytes'] = dict(d)
+    try:
+        options['budget-font-bytes'] = dict((k, int(v)) for k, v in
+                                            options['budget-font-bytes'].iteritems())
+    except ValueError:
+        parser.error('Invalid budget-font-bytes: {0}'.format(options['budget-font-bytes']))
+    for opt, cast in (('budget-glyph-points', int), ('budget-seconds', float)):
+        if options[opt] is not None: options[opt] = cast(options[opt])
+
+def _file_hash(path):
+    key = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), ''):
+            key.update(chunk)
+    return key.hexdigest()
+
+def finish(options = {}, icons = [], **args):
+    glyphs = options.get('_font_glyphs', {})
+    manifest = {
+        'icons': [],
+        'outputs': [],
+        'timings': dict(options['_timings'], total=time.time() - options['_started'])
+    }
+    for icon in sorted(icons, key=lambda x: x['name']):
+        item = { 'name': icon['name'], 'source': _file_hash(icon['file']) }
+        if 'code' in icon: item['code'] = icon['code']
+        if icon['name'] in glyphs:
+            item['width'] = glyphs[icon['name']]['width']
+            item['points'] = glyphs[icon['name']].get('points')
+        manifest['icons'].append(item)
+    for path in sorted(set(options['_outputs'])):
+        if not os.path.isfile(path): continue
+        manifest['outputs'].append({
+            'file': os.path.relpath(path, options['output-dir']),
+            'bytes': os.path.getsize(path),
+            'hash': _file_hash(path)
+        })
+    manifest['violations'] = violations = check_budgets(options, manifest)
+    with open(options['manifest-file'], 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    if not violations: return
+    for x in violations: print('budget exceeded: {0}'.format(x))
+    # watch mode reports violations and keeps running
+    if not options['watch']: exit(1)
+
+def check_budgets(options, manifest):
+    violations = []
+    limit = options['budget-glyph-points']
+    if limit is not None:
+        violations += ['{0} has {1} points, max {2}'.format(x['name'], x['points'], limit)
+                       for x in manifest['icons'] if (x.get('points') or 0) > limit]
+    # fonts of css-only builds are not written, so builds are checked directly
+    for build in options.get('_font_builds', []):
+        for fmt, name in sorted(build.get('files', {}).iteritems()):
+            limit = options['budget-font-bytes'].get(fmt)
+            path = os.path.join(options['font-output'], name)
+            if limit is None or not os.path.isfile(path): continue
+            if os.path.getsize(path) > limit:
+                violations.append('{0} is {1} bytes, max {2}'.format(
+                    name, os.path.getsize(path), limit))
+    limit = options['budget-seconds']
+    if limit is not None and manifest['timings']['total'] > limit:
+        violations.append('build took {0:.2f}s, max {1}s'.format(
+            manifest['timings']['total'], limit))
+    return violations
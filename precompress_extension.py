@@ -0,0 +1,142 @@
+import StringIO
+import hashlib
+import gzip
+import json
+import os
+import re
+import lazy
+from tasks import run_tasks
+
+brotli = lazy.module('brotli')
+
+# runs after all extensions writing outputs
+REQUIRES = ['font', 'css', 'css_vars', 'subset', 'shard', 'sprite']
+
+COMPRESSIONS = ['gz', 'br']
+
+# woff, woff2 and png are compressed already
+EXTENSIONS = 'css,svg,ttf,otf,eot,sfd,json'
+
+CSS_TOKEN_RE = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|' +
+                          r'(/\*.*?\*/)|' +
+                          r'(\s*;?\s*\}\s*)|' +
+                          r'\s*([{;,>])\s*|' +
+                          r'(:)\s+|' +
+                          r'(\s+)', re.S)
+
+def get_options(parser):
+    group = parser.add_argument_group('precompression options')
+    group.add_argument('--precompress-formats',
+                       dest='precompress-formats', default='gz',
+                       help='comma separated compressed siblings to write:' +
+                            ' gz, br (br requires brotli module)' +
+                            ' (default: "gz")')
+    group.add_argument('--precompress-extensions',
+                       dest='precompress-extensions', default=EXTENSIONS,
+                       help='comma separated extensions of compressed' +
+                            ' files (default: "' + EXTENSIONS + '")')
+    group.add_argument('--precompress-state',
+                       dest='precompress-state', default='.webfont-precompress.json',
+                       help='file with hashes of compressed files relative' +
+                            ' to work-dir, unchanged files are skipped' +
+                            ' (default: ".webfont-precompress.json")')
+    group.add_argument('--precompress-minify-css',
+                       dest='precompress-minify-css', default=False,
+                       action='store_true',
+                       help='minify css files before compression' +
+                            ' (default: False)')
+
+def parse_options(options, parser):
+    for opt in ('precompress-formats', 'precompress-extensions'):
+        if isinstance(options[opt], basestring):
+            options[opt] = [x for x in re.split('[\s,]+', options[opt]) if x]
+    for fmt in options['precompress-formats']:
+        if fmt not in COMPRESSIONS:
+            parser.error('Unknown precompress format: {0}'.format(fmt))
+    if 'br' in options['precompress-formats']:
+        try:
+            brotli.compress
+        except ImportError:
+            parser.error('br precompression requires brotli module')
+    options['precompress-extensions'] = set(
+        '.' + x.lstrip('.') for x in options['precompress-extensions'])
+    options['precompress-state'] = os.path.join(options['work-dir'],
+                                                options['precompress-state'])
+
+def finish(options = {}, **args):
+    try:
+        with open(options['precompress-state'], 'r') as f:
+            state = json.load(f)
+    except (IOError, ValueError):
+        state = {}
+    files = sorted(set(os.path.abspath(x) for x in options['_outputs']
+                       if os.path.splitext(x)[1] in options['precompress-extensions']))
+    tasks = [(x, state.get(x), options['precompress-formats'],
+              options['precompress-minify-css']) for x in files]
+    results = run_tasks(compress, tasks, options['jobs'])
+    state.update((path, digest) for path, digest, sizes in results)
+    # written and kept siblings are outputs too
+    options['_outputs'].extend(path + '.' + fmt for path, digest, sizes in results
+                                   for fmt in options['precompress-formats'])
+    with open(options['precompress-state'], 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    compressed = [x for x in results if x[2] is not None]
+    print('precompress: {0} files, {1} unchanged'.format(
+        len(compressed), len(results) - len(compressed)))
+    if options['debug']:
+        for path, digest, sizes in compressed:
+            print('  {0}: {1}'.format(path, ', '.join(
+                '{0} {1}'.format(k, v) for k, v in sorted(sizes.items()))))
+
+# minifies css if required and writes compressed siblings of file unless its
+# content hash is the same as in previous build. Returns path, content hash
+# and sizes by format (None when skipped)
+def compress(task):
+    path, previous, formats, minify = task
+    with open(path, 'rb') as f:
+        data = f.read()
+    if minify and path.endswith('.css'):
+        minified = minify_css(data)
+        if minified != data:
+            data = minified
+            with open(path, 'wb') as f:
+                f.write(data)
+    digest = hashlib.sha1(data).hexdigest()
+    if digest == previous and \
+       all(os.path.isfile(path + '.' + fmt) for fmt in formats):
+        return path, digest, None
+    sizes = { 'raw': len(data) }
+    for fmt in formats:
+        if fmt == 'gz':
+            compressed = gzip_data(data)
+        else:
+            compressed = brotli.compress(data, quality=11, mode=brotli.MODE_FONT
+                if os.path.splitext(path)[1] in ('.ttf', '.otf', '.eot')
+                else brotli.MODE_TEXT)
+        # write through temporary file so servers never see partial files
+        with open(path + '.' + fmt + '.tmp', 'wb') as f:
+            f.write(compressed)
+        os.rename(path + '.' + fmt + '.tmp', path + '.' + fmt)
+        sizes[fmt] = len(compressed)
+    return path, digest, sizes
+
+# gzip without file name and modification time, so output is reproducible
+def gzip_data(data):
+    buf = StringIO.StringIO()
+    f = gzip.GzipFile(filename='', mode='wb', compresslevel=9, fileobj=buf, mtime=0)
+    try:
+        f.write(data)
+    finally:
+        f.close()
+    return buf.getvalue()
+
+def minify_css(data):
+    def replace(m):
+        string, comment, close, punctuation, colon, space = m.groups()
+        if string is not None: return string
+        if comment is not None: return ''
+        if close is not None: return '}'
+        if punctuation is not None: return punctuation
+        if colon is not None: return colon
+        return ' '
+    return CSS_TOKEN_RE.sub(replace, data).strip()
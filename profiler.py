@@ -0,0 +1,85 @@
+import time
+import cProfile
+import contextlib
+
+# collects extension hooks and library calls timings for --profile report
+class Profiler(object):
+    def __init__(self, top=10, cprofile=False):
+        self.top = top
+        self.hooks = {}     # (extension, hook): [seconds, ...]
+        self.icons = {}     # extension: {icon name: seconds}
+        self.calls = {}     # library call: [seconds, ...]
+        self.cprofile = cProfile.Profile() if cprofile else None
+
+    def call(self, ext, hook, fn, *args, **kwargs):
+        started = time.time()
+        if self.cprofile is not None:
+            result = self.cprofile.runcall(fn, *args, **kwargs)
+        else:
+            result = fn(*args, **kwargs)
+        passed = time.time() - started
+        self.hooks.setdefault((ext, hook), []).append(passed)
+        if hook == 'process' and kwargs.get('icon') is not None:
+            self._add_icon(ext, kwargs['icon']['name'], passed)
+        return result
+
+    def _add_icon(self, ext, name, seconds):
+        icons = self.icons.setdefault(ext, {})
+        icons[name] = icons.get(name, 0.0) + seconds
+
+    # adds prepare hooks and library calls timings of icon prepared in worker
+    # process, icon time is sum of its prepare and process
+    def add_prepared(self, name, hooks, calls):
+        for ext, seconds in hooks.iteritems():
+            self.hooks.setdefault((ext, 'prepare'), []).append(seconds)
+            self._add_icon(ext, name, seconds)
+        for call, times in calls.iteritems():
+            self.calls.setdefault(call, []).extend(times)
+
+    @contextlib.contextmanager
+    def measure(self, name):
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.add(name, time.time() - started)
+
+    def add(self, name, seconds):
+        self.calls.setdefault(name, []).append(seconds)
+
+    def report(self):
+        lines = ['{0:<32} {1:>7} {2:>9} {3:>9} {4:>9} {5:>9}'.format(
+            'hook', 'calls', 'total', 'p50', 'p90', 'p99')]
+        for (ext, hook), times in sorted(self.hooks.items()):
+            lines.append(_stats_line('{0}.{1}'.format(ext, hook), times))
+        if self.calls:
+            lines += ['', '{0:<32} {1:>7} {2:>9} {3:>9} {4:>9} {5:>9}'.format(
+                'library call', 'calls', 'total', 'p50', 'p90', 'p99')]
+            for name, times in sorted(self.calls.items()):
+                lines.append(_stats_line(name, times))
+        for ext, icons in sorted(self.icons.items()):
+            lines += ['', 'slowest icons in {0}:'.format(ext)]
+            for name, passed in sorted(icons.items(), key=lambda x: -x[1])[:self.top]:
+                lines.append('  {0:<30} {1:>9.4f}'.format(name, passed))
+        return '\n'.join(lines)
+
+    def dump_stats(self, path):
+        if self.cprofile is not None: self.cprofile.dump_stats(path)
+
+def _percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+def _stats_line(name, times):
+    times = sorted(times)
+    return '{0:<32} {1:>7} {2:>9.4f} {3:>9.4f} {4:>9.4f} {5:>9.4f}'.format(
+        name, len(times), sum(times),
+        _percentile(times, 50), _percentile(times, 90), _percentile(times, 99))
+
+@contextlib.contextmanager
+def _noop():
+    yield
+
+# context manager measuring library call when profiling is on
+def measure(options, name):
+    if options.get('_profiler') is None: return _noop()
+    return options['_profiler'].measure(name)
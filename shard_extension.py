@@ -0,0 +1,94 @@
+import re
+
+REQUIRES = ['font', 'css']
+
+SHARD_BY = ['block', 'dir', 'map']
+
+def get_options(parser):
+    group = parser.add_argument_group('font sharding options')
+    group.add_argument('--shard-by',
+                       dest='shard-by', default='block', choices=SHARD_BY,
+                       help='split glyphs into shard fonts by codepoint' +
+                            ' blocks, icons subfolders (requires --recursive)' +
+                            ' or shard-map (default: block)')
+    group.add_argument('--shard-block-size',
+                       dest='shard-block-size', default=256, type=int,
+                       help='codepoints in shard for block sharding' +
+                            ' (default: 256)')
+    group.add_argument('--shard-map',
+                       dest='shard-map', default={},
+                       help='shard icons in form "shard1: icon1, icon2;' +
+                            ' shard2: icon3" (default: none)')
+    group.add_argument('--shard-default',
+                       dest='shard-default', default='base',
+                       help='shard of icons not listed in shard-map or' +
+                            ' placed in icons-dir itself (default: "base")')
+
+def parse_options(options, parser):
+    if options['shard-by'] not in SHARD_BY:
+        parser.error('Unknown shard-by value: {0}'.format(options['shard-by']))
+    if options['shard-by'] == 'dir' and not options['recursive']:
+        parser.error('Sharding by folders requires --recursive option')
+    options['shard-block-size'] = int(options['shard-block-size'])
+    if options['shard-block-size'] < 1:
+        parser.error('Invalid shard-block-size: {0}'.format(options['shard-block-size']))
+    if isinstance(options['shard-map'], basestring):
+        d = [map(str.strip, x.split(':', 2)) for x in options['shard-map'].split(';') if ':' in x]
+        options['shard-map'] = dict((k, [y for y in re.split('[\s,]+', v) if y])
+                                    for k, v in d)
+
+# shard name of icon
+def get_shard(options, icon, shards):
+    if options['shard-by'] == 'block':
+        start = icon['code'] - icon['code'] % options['shard-block-size']
+        return '{0:04x}'.format(start)
+    if options['shard-by'] == 'dir':
+        return re.sub('[^a-zA-Z0-9\-]+', '-', icon['dir']).strip('-') or \
+               options['shard-default']
+    return shards.get(icon['name'], options['shard-default'])
+
+def init(options = {}, icons = [], extensions = {}, **args):
+    if 'font' not in extensions or 'css' not in extensions:
+        print 'shard extension requires font and css extensions'
+        exit(1)
+    options['_shard_map'] = dict((name, shard)
+                                 for shard, names in options['shard-map'].iteritems()
+                                     for name in names)
+    # shard name: build, css-file gets @font-face for every shard instead
+    # of full font
+    options['_shards'] = {}
+    options['_css_font_faces'] = []
+    # full font is not referenced by css, only sfd is kept if requested
+    options['_font_builds'][0]['formats'] = []
+    for icon in icons:
+        if 'code' in icon: add_icon(options, extensions, icon)
+
+# adds icon to its shard, new shard build is created for the first icon.
+# Icons added in watch mode are assigned in process
+def add_icon(options, extensions, icon):
+    shard = get_shard(options, icon, options['_shard_map'])
+    if shard not in options['_shards']:
+        build = extensions['font'].add_build(
+            options, options['font-family'] + '-' + shard, set())
+        build['unicode-range'] = True
+        options['_shards'][shard] = build
+        options['_css_font_faces'] = [options['_shards'][x]
+                                      for x in sorted(options['_shards'])]
+    options['_shards'][shard]['names'].add(icon['name'])
+
+def process(icon=None, options={}, extensions={}, **args):
+    if 'code' in icon: add_icon(options, extensions, icon)
+
+# shards without icons are not generated
+def remove(icon=None, options={}, **args):
+    for shard, build in options['_shards'].items():
+        build['names'].discard(icon['name'])
+        if build['names']: continue
+        del options['_shards'][shard]
+        options['_font_builds'].remove(build)
+        options['_css_font_faces'].remove(build)
+
+def finish(options = {}, **args):
+    print('shards: {0}'.format(', '.join(
+        '{0} ({1})'.format(x['file'], len(x['names']))
+        for x in options['_css_font_faces'])))
@@ -0,0 +1,223 @@
+import StringIO
+import math
+import os
+import re
+import profiler
+import lazy
+
+cairo = lazy.module('cairo')
+
+REQUIRES = ['svg', 'css']
+
+# media query of high density sprites
+MEDIA = '@media (-webkit-min-device-pixel-ratio: {0}), (min-resolution: {1}dpi)'
+
+def get_options(parser):
+    group = parser.add_argument_group('PNG sprite options')
+    group.add_argument('--sprite-scales',
+                       dest='sprite-scales', default='1,2',
+                       help='comma separated pixel ratios of rendered' +
+                            ' sprites (default: "1,2")')
+    group.add_argument('--sprite-size',
+                       dest='sprite-size', type=int,
+                       help='icon height in pixels at 1x, width is scaled' +
+                            ' proportionally (default: size of SVG)')
+    group.add_argument('--sprite-padding',
+                       dest='sprite-padding', default=1, type=int,
+                       help='space between icons in pixels at 1x' +
+                            ' (default: 1)')
+    group.add_argument('--sprite-output',
+                       dest='sprite-output', default='',
+                       help='sprites and sprite css output folder relative' +
+                            ' to output-dir (default: output-dir itself)')
+    group.add_argument('--sprite-file',
+                       dest='sprite-file', default='sprite',
+                       help='sprite file name without extension, scale is' +
+                            ' added as @2x suffix (default: "sprite")')
+    group.add_argument('--sprite-url',
+                       dest='sprite-url', default='url({filename})',
+                       help='sprite url template, use {filename} placeholder' +
+                            ' for sprite file name (default: "url({filename})")')
+    group.add_argument('--sprite-class',
+                       dest='sprite-class', default='sprite',
+                       help='css class for all sprite icons (default: "sprite")')
+    group.add_argument('--sprite-prefix',
+                       dest='sprite-prefix',
+                       help='css prefix for individual sprite icon classes' +
+                            ' (default: sprite-class and "-")')
+
+def parse_options(options, parser):
+    if isinstance(options['sprite-scales'], basestring):
+        options['sprite-scales'] = [x for x in re.split('[\s,]+', options['sprite-scales']) if x]
+    try:
+        options['sprite-scales'] = sorted(set(
+            int(x) if float(x) == int(float(x)) else float(x)
+            for x in options['sprite-scales']))
+    except ValueError:
+        parser.error('Invalid sprite-scales: {0}'.format(options['sprite-scales']))
+    if not options['sprite-scales'] or options['sprite-scales'][0] <= 0:
+        parser.error('Invalid sprite-scales: {0}'.format(options['sprite-scales']))
+    options['sprite-padding'] = max(0, int(options['sprite-padding']))
+    options['sprite-output'] = os.path.join(options['output-dir'], options['sprite-output'])
+    if options['sprite-prefix'] is None:
+        options['sprite-prefix'] = options['sprite-class'] + '-'
+
+def init(options = {}, extensions = {}, **args):
+    if 'svg' not in extensions:
+        print 'sprite extension requires svg extension'
+        exit(1)
+    if not os.path.isdir(options['sprite-output']):
+        os.makedirs(options['sprite-output'])
+    # icon name: rendered icon, see prepare
+    options['_sprite'] = {}
+
+# renders icon at every scale into PNG, returns icon size at 1x and PNG data
+# by scale
+def prepare(icon=None, options={}, extensions={}, **args):
+    handle = extensions['svg'].get_document(icon).handle
+    ratio = 1.0
+    if options['sprite-size'] is not None:
+        ratio = float(options['sprite-size']) / handle.props.height
+    width = handle.props.width * ratio
+    height = handle.props.height * ratio
+    images = {}
+    with profiler.measure(options, 'cairo.sprite'):
+        for scale in options['sprite-scales']:
+            surface = cairo.ImageSurface(cairo.FORMAT_ARGB32,
+                                         int(math.ceil(width * scale)),
+                                         int(math.ceil(height * scale)))
+            ctx = cairo.Context(surface)
+            ctx.scale(ratio * scale, ratio * scale)
+            handle.render_cairo(ctx)
+            buf = StringIO.StringIO()
+            surface.write_to_png(buf)
+            images[scale] = buf.getvalue()
+    return {
+        'width': int(math.ceil(width)),
+        'height': int(math.ceil(height)),
+        'images': images
+    }
+
+def process(icon=None, options={}, extensions={}, **args):
+    prepared = icon.get('prepared', {}).get('sprite')
+    if prepared is None:
+        prepared = prepare(icon=icon, options=options, extensions=extensions)
+    aliases = options.get('css-aliases') or {}
+    names = [icon['name']] + aliases.get(icon['name'], [])
+    options['_sprite'][icon['name']] = dict(prepared, names=names)
+
+def remove(icon=None, options={}, **args):
+    options['_sprite'].pop(icon['name'], None)
+
+def finish(options = {}, **args):
+    icons = options['_sprite']
+    if not icons: return
+    padding = options['sprite-padding']
+    names = sorted(icons)
+    width, height, positions = pack(
+        [(icons[x]['width'] + padding, icons[x]['height'] + padding) for x in names])
+    positions = dict(zip(names, positions))
+    files = {}
+    for scale in options['sprite-scales']:
+        files[scale] = options['sprite-file'] + \
+                       ('' if scale == 1 else '@{0}x'.format(scale)) + '.png'
+        atlas = cairo.ImageSurface(cairo.FORMAT_ARGB32,
+                                   int(math.ceil(width * scale)),
+                                   int(math.ceil(height * scale)))
+        ctx = cairo.Context(atlas)
+        for name in names:
+            image = cairo.ImageSurface.create_from_png(
+                StringIO.StringIO(icons[name]['images'][scale]))
+            x, y = positions[name]
+            ctx.set_source_surface(image, x * scale, y * scale)
+            ctx.paint()
+        atlas.write_to_png(os.path.join(options['sprite-output'], files[scale]))
+        options['_outputs'].append(os.path.join(options['sprite-output'], files[scale]))
+    write_css(options, files, width, height, positions)
+    area = sum((x['width'] + padding) * (x['height'] + padding) for x in icons.itervalues())
+    print('sprite: {0} icons, {1}x{2}, {3:.0%} filled'.format(
+        len(icons), width, height, float(area) / (width * height)))
+
+def write_css(options, files, width, height, positions):
+    path = os.path.join(options['sprite-output'], options['sprite-file'] + '.css')
+    options['_outputs'].append(path)
+    scales = options['sprite-scales']
+    with open(path, 'w') as css:
+        css.write('.{0} {{\n  display: inline-block;\n'.format(options['sprite-class']))
+        css.write('  background-image: {0};\n'.format(
+            options['sprite-url'].format(filename = files[scales[0]])))
+        css.write('  background-repeat: no-repeat;\n')
+        css.write('  background-size: {0}px {1}px;\n}}\n\n'.format(width, height))
+        for scale in scales[1:]:
+            css.write(MEDIA.format(scale, int(scale * 96)))
+            css.write(' {{\n  .{0} {{ background-image: {1}; }}\n}}\n\n'.format(
+                options['sprite-class'],
+                options['sprite-url'].format(filename = files[scale])))
+        for name in sorted(positions):
+            icon = options['_sprite'][name]
+            x, y = positions[name]
+            css.write(', '.join('.{0}{1}'.format(options['sprite-prefix'], alias)
+                                for alias in icon['names']))
+            css.write(' {{ background-position: {0}px {1}px;'
+                      ' width: {2}px; height: {3}px; }}\n'.format(
+                          -x, -y,
+                          icon['width'], icon['height']))
+
+# MaxRects packing
+
+# free space of fixed width bin as list of maximal free rectangles
+# (x, y, width, height). Rectangles are placed with bottom-left rule: lowest
+# position, then leftmost
+class MaxRects(object):
+    def __init__(self, width, height):
+        self.free = [(0, 0, width, height)]
+
+    def insert(self, width, height):
+        best = None
+        for x, y, w, h in self.free:
+            if width <= w and height <= h and \
+               (best is None or (y + height, x) < best):
+                best = (y + height, x)
+        if best is None: return None
+        position = (best[1], best[0] - height)
+        self._split(position[0], position[1], width, height)
+        return position
+
+    def _split(self, x, y, width, height):
+        free = []
+        for rect in self.free:
+            fx, fy, fw, fh = rect
+            if x >= fx + fw or x + width <= fx or y >= fy + fh or y + height <= fy:
+                free.append(rect)
+                continue
+            if x > fx: free.append((fx, fy, x - fx, fh))
+            if x + width < fx + fw: free.append((x + width, fy, fx + fw - x - width, fh))
+            if y > fy: free.append((fx, fy, fw, y - fy))
+            if y + height < fy + fh: free.append((fx, y + height, fw, fy + fh - y - height))
+        # rectangle can be contained only in rectangle with the same or larger
+        # area, so every one is checked against following ones
+        free.sort(key=lambda r: r[2] * r[3])
+        self.free = [a for i, a in enumerate(free)
+                     if not any(a[0] >= b[0] and a[1] >= b[1] and
+                                a[0] + a[2] <= b[0] + b[2] and
+                                a[1] + a[3] <= b[1] + b[3]
+                                for b in free[i + 1:])]
+
+# packs sizes into the smallest of few bins with different widths, returns
+# bin size and positions in sizes order
+def pack(sizes):
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    area = sum(w * h for w, h in sizes)
+    side = max(max(w for w, h in sizes), int(math.ceil(math.sqrt(area))))
+    limit = sum(h for w, h in sizes)
+    best = None
+    for width in sorted(set(max(side, int(side * k)) for k in (1.0, 1.1, 1.25))):
+        rects = MaxRects(width, limit)
+        positions = [None] * len(sizes)
+        for i in order:
+            positions[i] = rects.insert(*sizes[i])
+        used = (max(x + sizes[i][0] for i, (x, y) in enumerate(positions)),
+                max(y + sizes[i][1] for i, (x, y) in enumerate(positions)))
+        if best is None or used[0] * used[1] < best[0] * best[1]:
+            best = used + (positions,)
+    return best
@@ -0,0 +1,103 @@
+import os
+import re
+from tasks import run_tasks
+
+REQUIRES = ['font', 'css']
+
+SCAN_EXTENSIONS = 'html,htm,erb,haml,slim,php,twig,jinja,j2,hbs,mustache,' + \
+                  'vue,js,jsx,ts,tsx'
+
+def get_options(parser):
+    group = parser.add_argument_group('font subsetting options')
+    group.add_argument('--subset-icons',
+                       dest='subset-icons', default=[],
+                       help='comma separated icon names, aliases or css' +
+                            ' classes to include into subset (default: none)')
+    group.add_argument('--subset-scan',
+                       dest='subset-scan', default=[],
+                       help='comma separated folders relative to work-dir' +
+                            ' to scan for used css classes (default: none)')
+    group.add_argument('--subset-scan-extensions',
+                       dest='subset-scan-extensions', default=SCAN_EXTENSIONS,
+                       help='comma separated extensions of scanned files' +
+                            ' (default: "' + SCAN_EXTENSIONS + '")')
+    group.add_argument('--subset-suffix',
+                       dest='subset-suffix', default='subset',
+                       help='suffix added to subset font and css file names' +
+                            ' (default: "subset")')
+
+def parse_options(options, parser):
+    for opt in ('subset-icons', 'subset-scan', 'subset-scan-extensions'):
+        if isinstance(options[opt], basestring):
+            options[opt] = [x for x in re.split('[\s,]+', options[opt]) if x]
+    options['subset-scan'] = [os.path.join(options['work-dir'], x)
+                                for x in options['subset-scan']]
+    for folder in options['subset-scan']:
+        if not os.path.isdir(folder):
+            parser.error('Subset scan folder {0} doesn\'t exists'.format(folder))
+    options['subset-scan-extensions'] = set(
+        '.' + x.lstrip('.') for x in options['subset-scan-extensions'])
+
+def init(options = {}, icons = [], extensions = {}, **args):
+    if 'font' not in extensions or 'css' not in extensions:
+        print 'subset extension requires font and css extensions'
+        exit(1)
+    # icon names by css names and aliases
+    lookup = {}
+    for icon in icons:
+        if 'code' not in icon: continue
+        for name in [icon['name']] + options['css-aliases'].get(icon['name'], []):
+            lookup[name] = icon['name']
+    prefix = options['css-prefix']
+    # requested css names, they are kept to include icons added in watch mode
+    wanted = set()
+    for x in options['subset-icons']:
+        if x.startswith(prefix) and x not in lookup: x = x[len(prefix):]
+        if x not in lookup: print('Unknown subset icon: {0}'.format(x))
+        wanted.add(x)
+    wanted |= scan(options)
+    options['_subset_names'] = wanted
+    names = set(lookup[x] for x in wanted if x in lookup)
+    file = options['font-family'] + '-' + options['subset-suffix']
+    options['_subset'] = extensions['font'].add_build(options, file, names)
+
+# icons added or renamed in watch mode
+def process(icon=None, options={}, **args):
+    if 'code' not in icon: return
+    names = [icon['name']] + options['css-aliases'].get(icon['name'], [])
+    if options['_subset_names'].intersection(names):
+        options['_subset']['names'].add(icon['name'])
+
+def remove(icon=None, options={}, **args):
+    options['_subset']['names'].discard(icon['name'])
+
+def finish(options = {}, extensions = {}, **args):
+    build = options['_subset']
+    path, ext = os.path.splitext(options['css-file'])
+    codes = dict((k, v) for k, v in options['_css'].iteritems()
+                    if k in build['names'])
+    extensions['css'].write_css(options,
+                                path + '-' + options['subset-suffix'] + ext,
+                                [build], codes)
+    print('subset: {0} of {1} icons'.format(len(codes), len(options['_css'])))
+
+# css class names with css-prefix found in templates
+def scan(options):
+    files = [os.path.join(root, x)
+                for folder in options['subset-scan']
+                    for root, dirs, names in os.walk(folder)
+                        for x in names
+                            if os.path.splitext(x)[1] in options['subset-scan-extensions']]
+    tasks = [(x, options['css-prefix']) for x in files]
+    return set().union(*run_tasks(scan_file, tasks, options['jobs']))
+
+# file is read line by line, so large files aren't loaded into memory
+def scan_file(task):
+    path, prefix = task
+    # prefix must start a token, so short prefixes don't match inside words
+    regex = re.compile('(?<![\w-])' + re.escape(prefix) + '([a-zA-Z][a-zA-Z0-9\-]*)')
+    found = set()
+    with open(path, 'r') as f:
+        for line in f:
+            if prefix in line: found.update(regex.findall(line))
+    return found
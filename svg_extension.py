@@ -1,17 +1,76 @@
-import cairo
-import rsvg
 import xml.dom.minidom
+import xml.parsers.expat
+import xml.sax.saxutils
 import re
+import lazy
+
+rsvg = lazy.module('rsvg')
+
+def prepare(icon = None, **args):
+    return { 'color': get_color(icon=icon) }
 
 def process(icon = None, **args):
     if icon['options']['debug']:
         print('opening SVG file {0}'.format(icon['file']))
-    icon['svg'] = rsvg.Handle(file=icon['file'])
-    icon['color'] = get_color(icon=icon)
+    document = get_document(icon)
+    if 'prepared' in icon and 'svg' in icon['prepared']:
+        document.color = icon['prepared']['svg']['color']
+
+# parsed icon shared between all extensions. File is read once, DOM, rsvg
+# handle and color are created on first access. Unknown attributes are
+# delegated to rsvg handle, so document can be used as a handle itself
+class Document(object):
+    def __init__(self, file):
+        self.file = file
+        self._data = None
+        self._dom = None
+        self._handle = None
+        self._color = None
+        self._has_color = False
+
+    @property
+    def data(self):
+        if self._data is None:
+            with open(self.file, 'rb') as f:
+                self._data = f.read()
+        return self._data
+
+    # DOM is shared, changes made by one extension are seen by others
+    @property
+    def dom(self):
+        if self._dom is None:
+            self._dom = xml.dom.minidom.parseString(self.data)
+        return self._dom
+
+    @property
+    def handle(self):
+        if self._handle is None:
+            self._handle = rsvg.Handle(data=self.data)
+        return self._handle
+
+    # color is scanned from file data, so it doesn't depend on DOM changes
+    @property
+    def color(self):
+        if not self._has_color: self.color = scan(self.data)[0]
+        return self._color
+
+    @color.setter
+    def color(self, value):
+        self._color = value
+        self._has_color = True
+
+    def __getattr__(self, name):
+        if name.startswith('_'): raise AttributeError(name)
+        return getattr(self.handle, name)
+
+def get_document(icon):
+    if not isinstance(icon.get('svg'), Document):
+        icon['svg'] = Document(icon['file'])
+    return icon['svg']
 
 def get_dom(icon=None, file=None):
     if file is None and icon is None: return None
-    if file is None: file = icon['file']
+    if file is None: return get_document(icon).dom
     if isinstance(file, basestring): file = open(file, 'r')
     try:
         dom = xml.dom.minidom.parse(file)
@@ -19,19 +78,80 @@ def get_dom(icon=None, file=None):
         file.close()
     return dom
 
-# find color in dom
+# find color in icon or file
 def get_color(icon=None, file=None):
     if icon is not None and 'color' in icon: return icon['color']
-    dom = get_dom(icon=icon, file=file)
-    if dom is None: return None
-    color = None
-    for x in iter_styles(dom, styles='colors'):
-        for k, v in x['style'].iteritems():
-            if isinstance(v, Color) and v.web != '#000':
-                color = v
-                break
-        if color is not None: break
-    return color
+    if file is None and icon is not None: return get_document(icon).color
+    if file is None: return None
+    if isinstance(file, basestring):
+        with open(file, 'rb') as f:
+            return scan(f.read())[0]
+    return scan(file.read())[0]
+
+class _Found(Exception):
+    pass
+
+# single pass streaming scanner. Finds first non-black fill or stroke color
+# and, if strip styles are given, serializes SVG without them. Scanning stops
+# at found color when nothing is stripped. Returns (color, stripped data)
+def scan(data, strip=None):
+    subject = set(_parse_styles_arg(strip)) if strip is not None else None
+    colors = set(_parse_styles_arg('colors')) & set(STYLES_COLOR)
+    out = [u'<?xml version="1.0" ?>'] if subject is not None else None
+    found = []
+
+    def start(name, attrs):
+        # attributes are flat [name, value, ...] list, see ordered_attributes
+        attrs = zip(attrs[::2], attrs[1::2])
+        if not found:
+            for k, v in _iter_styles(attrs):
+                if k in colors:
+                    color = Color.parse(v)
+                    if color.web != '#000':
+                        found.append(color)
+                        if out is None: raise _Found()
+                        break
+        if out is None: return
+        out.append(u'<' + name)
+        for k, v in attrs:
+            if k in subject: continue
+            if k == 'style':
+                v = u';'.join(u':'.join(x) for x in _split_style(v)
+                                if x[0] not in subject)
+                if not v: continue
+            out.append(u' {0}={1}'.format(k, xml.sax.saxutils.quoteattr(v)))
+        out.append(u'>')
+
+    def end(name):
+        if out is not None: out.append(u'</{0}>'.format(name))
+
+    def text(data):
+        if out is not None: out.append(xml.sax.saxutils.escape(data))
+
+    parser = xml.parsers.expat.ParserCreate()
+    parser.ordered_attributes = True
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = text
+    try:
+        parser.Parse(data, True)
+    except _Found:
+        pass
+    color = found[0] if found else None
+    if out is None: return color, None
+    return color, u''.join(out).encode('utf-8')
+
+# style declarations first, then presentation attributes
+def _iter_styles(attrs):
+    for k, v in attrs:
+        if k == 'style':
+            for x in _split_style(v): yield x
+    for k, v in attrs:
+        if k != 'style': yield k, v
+
+def _split_style(value):
+    return [tuple(y.strip() for y in x.split(':', 1))
+                for x in value.split(';') if ':' in x]
 
 STYLES = {
     'fonts': ['font', 'font-family', 'font-size', 'font-size-adjust',
@@ -58,17 +178,19 @@ STYLES = {
 STYLES_FLAT = [x for y in STYLES.values() for x in y]
 STYLES_COLOR = ['fill', 'stroke', 'stop-color', 'flood-color', 'lighting-color']
 
+# lazily walks DOM elements in document order, so consumers can stop early
 def iter_styles(dom, styles='all'):
-    styles = _parse_styles_arg(styles)
-    result = []
-    _collect_styles(dom.documentElement, result, subject=styles)
-    for x in result: yield x
+    subject = set(_parse_styles_arg(styles))
+    for node in _iter_elements(dom.documentElement):
+        style = dict((k, v) for k, v in _get_styles(node) if k in subject)
+        if style: yield { 'node': node, 'style': style }
 
 def extract_styles(icon=None, file=None, dom=None, styles=[]):
     if icon is None and dom is None and file is None: return None
     if dom is None: dom = get_dom(icon=icon, file=file)
-    styles = _parse_styles_arg(styles)
-    _extract_styles(dom.documentElement, subject=styles)
+    subject = set(_parse_styles_arg(styles))
+    for node in _iter_elements(dom.documentElement):
+        _extract_styles(node, subject=subject)
     return dom
 
 def replace_style(node, style, value):
@@ -86,15 +208,15 @@ def _parse_styles_arg(styles):
                for x in (STYLES[y] if y in STYLES else [y]) \
                    if x in STYLES_FLAT]
 
-def _collect_styles(node, styles, subject=[]):
-    if node.nodeType != xml.dom.minidom.Node.ELEMENT_NODE: return None
-    style = dict((k, v) for k, v in _get_styles(node) if k in subject)
-    if style: styles.append({ 'node': node, 'style': style })
-    for child in node.childNodes:
-        _collect_styles(child, styles, subject=subject)
+def _iter_elements(root):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node.nodeType != xml.dom.minidom.Node.ELEMENT_NODE: continue
+        yield node
+        stack.extend(reversed(node.childNodes))
 
 def _extract_styles(node, subject=[]):
-    if node.nodeType != xml.dom.minidom.Node.ELEMENT_NODE: return None
     style = [(k, v) for k, v in _get_style(node) if k not in subject]
     if len(style) > 0:
         node.setAttribute('style', ';'.join([':'.join((k, v)) for k, v in style]))
@@ -103,8 +225,6 @@ def _extract_styles(node, subject=[]):
     for attr in subject:
         if node.hasAttribute(attr):
             node.removeAttribute(attr)
-    for child in node.childNodes:
-        _extract_styles(child, subject=subject)
 
 def _get_style(node):
     if not node.hasAttribute('style'): return []
@@ -117,10 +237,13 @@ def _get_styles(node):
         if node.hasAttribute(attr):
             styles.append((attr, node.getAttribute(attr)))
     styles = [(k, v) for k, v in styles if k in STYLES_FLAT]
-    styles = map(lambda x: (x[0], Color(x[1])) if x[0] in STYLES_COLOR else x, styles)
+    styles = map(lambda x: (x[0], Color.parse(x[1])) if x[0] in STYLES_COLOR else x, styles)
     return styles
 
 class Color:
+    # parsed colors by value, see Color.parse
+    _cache = {}
+
     HEX_RE = re.compile('^#([0-9a-f])([0-9a-f])([0-9a-f])$', re.IGNORECASE)
     FULLHEX_RE = re.compile('^#([0-9a-f]{2})([0-9a-f]{2})([0-9a-f]{2})$', re.IGNORECASE)
     PERCENTS_RE = re.compile('^rgb\(\s*(\d{1,3})%,(\d{1,3})%,(\d{1,3})%\s*\)$', re.IGNORECASE)
@@ -151,6 +274,14 @@ class Color:
             return
         self.rgb = None
 
+    # memoized constructor, icons use the same few colors over and over
+    @classmethod
+    def parse(cls, value):
+        color = cls._cache.get(value)
+        if color is None:
+            color = cls._cache[value] = cls(value)
+        return color
+
     @property
     def web(self):
         if self.rgb is None: return '#000'
@@ -0,0 +1,14 @@
+import multiprocessing
+
+# maps fn over tasks on pool of jobs worker processes, or in current process
+# when there is nothing to parallelize. Results are in tasks order
+def run_tasks(fn, tasks, jobs, chunksize=None):
+    if jobs <= 1 or len(tasks) <= 1: return map(fn, tasks)
+    pool = multiprocessing.Pool(min(jobs, len(tasks)))
+    try:
+        results = pool.map(fn, tasks, chunksize)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return results
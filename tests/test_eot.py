@@ -0,0 +1,57 @@
+import os
+import struct
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import eot
+
+# TrueType font with OS/2, head and name tables only
+def make_font(weight=500, width=5, fs_type=8, family=u'Icons'):
+    os2 = bytearray(86)
+    struct.pack_into('>HHHHH', os2, 0, 1, 0, weight, width, fs_type)
+    os2[32:42] = bytearray(range(1, 11))
+    struct.pack_into('>4L', os2, 42, 1, 2, 3, 4)
+    struct.pack_into('>H', os2, 62, 1)
+    struct.pack_into('>2L', os2, 78, 5, 6)
+    head = bytearray(54)
+    struct.pack_into('>L', head, 8, 0x12345678)
+    value = family.encode('utf-16-be')
+    name = struct.pack('>HHH', 0, 1, 18) + \
+           struct.pack('>6H', 3, 1, 0x409, 1, len(value), 0) + value
+    tables = [('OS/2', str(os2)), ('head', str(head)), ('name', name)]
+    offset = 12 + 16 * len(tables)
+    directory = struct.pack('>LHHHH', 0x00010000, len(tables), 0, 0, 0)
+    body = ''
+    for tag, table in tables:
+        directory += struct.pack('>4sLLL', tag, 0, offset + len(body), len(table))
+        body += table
+    return directory + body
+
+class HeaderTest(unittest.TestCase):
+    def test_fields(self):
+        data = make_font()
+        header = eot.header(data)
+        size, font_size, version, flags = struct.unpack_from('<4L', header, 0)
+        self.assertEqual(size, len(header) + len(data))
+        self.assertEqual(font_size, len(data))
+        self.assertEqual(version, eot.VERSION)
+        self.assertEqual(header[16:26], str(bytearray(range(1, 11))))
+        charset, italic, weight, fs_type, magic = \
+            struct.unpack_from('<BBLHH', header, 26)
+        self.assertEqual((charset, italic), (eot.DEFAULT_CHARSET, 1))
+        self.assertEqual(weight, 500)
+        self.assertEqual(fs_type, 8)
+        self.assertEqual(magic, eot.MAGIC)
+        self.assertEqual(struct.unpack_from('<4L', header, 36), (1, 2, 3, 4))
+        self.assertEqual(struct.unpack_from('<2L', header, 52), (5, 6))
+        self.assertEqual(struct.unpack_from('<L', header, 60)[0], 0x12345678)
+        family_size = struct.unpack_from('<H', header, 82)[0]
+        self.assertEqual(header[84:84 + family_size], u'Icons'.encode('utf-16-le'))
+
+    def test_invalid_font(self):
+        self.assertRaises(ValueError, eot.header, 'not a font')
+
+if __name__ == '__main__':
+    unittest.main()
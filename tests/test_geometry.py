@@ -0,0 +1,70 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import geometry
+
+SQUARE = [(0, 0), ((100, 0),), ((100, 100),), ((0, 100),)]
+
+class SnapTest(unittest.TestCase):
+    def test_points_on_grid(self):
+        contours = geometry.snap([[(1.2, 3.9), ((10.4, 0.1),),
+                                   ((4.9, 5.1), (6, 7.6), (8.2, 9.7))]], 2)
+        self.assertEqual(contours, [[(2, 4), ((10, 0),), ((4, 6), (6, 8), (8, 10))]])
+
+class SimplifyTest(unittest.TestCase):
+    def test_collinear_lines(self):
+        contour = [(0, 0), ((50, 0),), ((100, 0),), ((100, 100),), ((0, 100),)]
+        self.assertEqual(geometry.simplify([contour], 0.5), [SQUARE])
+
+    def test_tolerance(self):
+        contour = [(0, 0), ((50, 1),), ((100, 0),), ((100, 100),), ((0, 100),)]
+        self.assertEqual(geometry.simplify([contour], 0.5), [contour])
+        self.assertEqual(geometry.simplify([contour], 2), [SQUARE])
+
+    def test_merged_points_stay_close(self):
+        # slowly turning lines are merged only while every removed point is
+        # close to the merged line
+        contour = [(0, 0), ((25, 0.4),), ((50, 0.8),), ((75, 1.2),), ((100, 0),),
+                   ((100, 100),), ((0, 100),)]
+        self.assertEqual(geometry.simplify([contour], 0.5),
+                         [[(0, 0), ((75, 1.2),), ((100, 0),), ((100, 100),), ((0, 100),)]])
+
+    def test_flat_curve(self):
+        contour = [(0, 0), ((30, 0), (70, 0), (100, 0)), ((100, 100),), ((0, 100),)]
+        self.assertEqual(geometry.simplify([contour], 0.5), [SQUARE])
+
+    def test_curve_is_kept(self):
+        contour = [(0, 0), ((30, 20), (70, 20), (100, 0)), ((100, 100),), ((0, 100),)]
+        self.assertEqual(geometry.simplify([contour], 0.5), [contour])
+
+    def test_zero_length_segments(self):
+        contour = [(0, 0), ((0, 0),), ((100, 0),), ((100, 0),), ((100, 100),),
+                   ((0, 100),), ((0, 0),)]
+        self.assertEqual(geometry.simplify([contour], 0), [SQUARE])
+
+    def test_closing_line(self):
+        # points on line from last point to start are removed
+        contour = SQUARE + [((0, 50),)]
+        self.assertEqual(geometry.simplify([contour], 0.5), [SQUARE])
+
+    def test_contours_without_area(self):
+        self.assertEqual(geometry.simplify([[(0, 0), ((50, 0),), ((100, 0),)]], 0.5), [])
+
+class StatsTest(unittest.TestCase):
+    def test_estimate_bytes(self):
+        # end point index, then flag and non-zero deltas of every point
+        self.assertEqual(geometry.estimate_bytes([[(0, 0), (10, 0), (300, 20)]], 1),
+                         2 + 1 + 2 + 4)
+
+    def test_stats(self):
+        before = geometry.points([SQUARE + [((0, 50),)]])
+        after = geometry.points([SQUARE])
+        points, points_after, size, size_after = geometry.stats(before, after, 1)
+        self.assertEqual((points, points_after), (5, 4))
+        self.assertTrue(size > size_after)
+
+if __name__ == '__main__':
+    unittest.main()
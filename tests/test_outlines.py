@@ -0,0 +1,118 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import font_extension
+
+try:
+    import fontforge
+except ImportError:
+    fontforge = None
+
+# SVG in the form written by cairo SVGSurface
+SVG = '<?xml version="1.0" encoding="UTF-8"?>\n' + \
+      '<svg xmlns="http://www.w3.org/2000/svg"' + \
+      ' xmlns:xlink="http://www.w3.org/1999/xlink" width="80pt" height="80pt"' + \
+      ' viewBox="{0}" version="1.1">\n' + \
+      '<g id="surface1">\n{1}\n</g>\n</svg>\n'
+
+def svg(body, view_box='0 0 100 100'):
+    return SVG.format(view_box, body)
+
+def path(d, transform=None):
+    attrs = ' transform="{0}"'.format(transform) if transform else ''
+    return '<path style="stroke:none;fill-rule:nonzero;fill:rgb(0%,0%,0%);' + \
+           'fill-opacity:1;" d="{0}"{1}/>'.format(d, attrs)
+
+SQUARE = 'M 10 10 L 90 10 L 90 90 L 10 90 Z M 10 10 '
+
+class ParseOutlinesTest(unittest.TestCase):
+    def test_scale_and_flip(self):
+        # viewBox height is scaled to em, y axis is flipped at ascent
+        contours = font_extension.parse_outlines(svg(path(SQUARE)))
+        self.assertEqual(contours, [[(100.0, 700.0), ((900.0, 700.0),),
+                                     ((900.0, -100.0),), ((100.0, -100.0),)]])
+
+    def test_view_box_offset(self):
+        contours = font_extension.parse_outlines(
+            svg(path('M 60 60 L 110 60 L 110 110 Z'), '50 50 50 50'))
+        self.assertEqual(contours, [[(200.0, 600.0), ((1200.0, 600.0),),
+                                     ((1200.0, -400.0),)]])
+
+    def test_closing_segment(self):
+        # explicit line back to start is the same as Z closing line
+        explicit = font_extension.parse_outlines(
+            svg(path('M 10 10 L 90 10 L 90 90 L 10 10 Z')))
+        implicit = font_extension.parse_outlines(
+            svg(path('M 10 10 L 90 10 L 90 90 Z')))
+        self.assertEqual(explicit, implicit)
+        self.assertEqual(len(explicit[0]), 3)
+
+    def test_curves(self):
+        contours = font_extension.parse_outlines(
+            svg(path('M 0 0 C 10 0 20 10 20 20 L 0 20 Z')))
+        self.assertEqual(contours, [[(0.0, 800.0),
+                                     ((100.0, 800.0), (200.0, 700.0), (200.0, 600.0)),
+                                     ((0.0, 600.0),)]])
+
+    def test_empty_contours(self):
+        contours = font_extension.parse_outlines(svg(path('M 10 10 Z M 20 20 ')))
+        self.assertEqual(contours, [])
+
+    def test_translate(self):
+        contours = font_extension.parse_outlines(
+            svg('<g transform="translate(10,20)">' +
+                path('M 0 0 L 10 0 L 10 10 Z') + '</g>'))
+        self.assertEqual(contours, [[(100.0, 600.0), ((200.0, 600.0),),
+                                     ((200.0, 500.0),)]])
+
+    def test_matrix(self):
+        contours = font_extension.parse_outlines(
+            svg(path('M 0 0 L 10 0 L 10 10 Z', 'matrix(2,0,0,2,10,0)')))
+        self.assertEqual(contours, [[(100.0, 800.0), ((300.0, 800.0),),
+                                     ((300.0, 600.0),)]])
+
+    def test_nested_transforms(self):
+        contours = font_extension.parse_outlines(
+            svg('<g transform="scale(2)">' +
+                path('M 0 0 L 10 0 L 10 10 Z', 'translate(5)') + '</g>'))
+        self.assertEqual(contours, [[(100.0, 800.0), ((300.0, 800.0),),
+                                     ((300.0, 600.0),)]])
+
+    def test_fallback(self):
+        clip = '<clipPath id="clip1"><path d="M 0 0 L 10 0 L 10 10 Z"/></clipPath>'
+        use = '<use xlink:href="#glyph0-1" x="10" y="10"/>'
+        for body in (clip + path(SQUARE), use,
+                     path(SQUARE, 'rotate(45)'), path('M 0 0 Q 10 0 10 10 Z')):
+            self.assertEqual(font_extension.parse_outlines(svg(body)), None)
+
+@unittest.skipIf(fontforge is None, 'fontforge is not installed')
+class FontforgeImportTest(unittest.TestCase):
+    # outlines drawn with pen match fontforge SVG import
+    def test_same_outlines(self):
+        data = svg(path('M 10 10 C 30 0 70 0 90 10 L 90 90 L 10 90 Z ' +
+                        'M 30 30 L 30 70 L 70 70 L 70 30 Z', 'translate(2,3)'))
+        font = fontforge.font()
+        font.em = font_extension.EM
+        try:
+            imported = font.createChar(0xE000)
+            with tempfile.NamedTemporaryFile(suffix='.svg') as tmp:
+                tmp.write(data)
+                tmp.flush()
+                imported.importOutlines(tmp.name)
+            drawn = font.createChar(0xE001)
+            font_extension.draw_outlines(drawn, font_extension.parse_outlines(data))
+            for glyph in (imported, drawn):
+                glyph.addExtrema()
+                glyph.correctDirection()
+            self.assertEqual(len(imported.foreground), len(drawn.foreground))
+            for a, b in zip(imported.boundingBox(), drawn.boundingBox()):
+                self.assertAlmostEqual(a, b, delta=1)
+        finally:
+            font.close()
+
+if __name__ == '__main__':
+    unittest.main()
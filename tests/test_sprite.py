@@ -0,0 +1,54 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sprite_extension
+
+def overlaps(a, b):
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and \
+           a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+class PackTest(unittest.TestCase):
+    def check(self, sizes):
+        width, height, positions = sprite_extension.pack(sizes)
+        self.assertEqual(len(positions), len(sizes))
+        rects = [(x, y, w, h) for (x, y), (w, h) in zip(positions, sizes)]
+        for i, a in enumerate(rects):
+            self.assertTrue(a[0] >= 0 and a[1] >= 0)
+            self.assertTrue(a[0] + a[2] <= width and a[1] + a[3] <= height)
+            for b in rects[i + 1:]:
+                self.assertFalse(overlaps(a, b), (a, b))
+        return width, height, positions
+
+    def test_single(self):
+        self.assertEqual(sprite_extension.pack([(16, 24)]), (16, 24, [(0, 0)]))
+
+    def test_equal_squares(self):
+        width, height, positions = self.check([(10, 10)] * 16)
+        self.assertEqual(width * height, 1600)
+
+    def test_random_sizes(self):
+        rnd = random.Random(1)
+        sizes = [(rnd.randint(8, 64), rnd.randint(8, 64)) for i in range(300)]
+        width, height, positions = self.check(sizes)
+        area = sum(w * h for w, h in sizes)
+        self.assertTrue(float(area) / (width * height) > 0.8)
+
+    def test_smallest_bin(self):
+        # wider bin keeps small icons next to wide one
+        width, height, positions = self.check([(200, 10), (10, 10), (10, 10)])
+        self.assertEqual((width, height), (220, 10))
+
+class MaxRectsTest(unittest.TestCase):
+    def test_bottom_left(self):
+        rects = sprite_extension.MaxRects(30, 30)
+        self.assertEqual(rects.insert(10, 20), (0, 0))
+        self.assertEqual(rects.insert(10, 10), (10, 0))
+        self.assertEqual(rects.insert(20, 10), (10, 10))
+        self.assertEqual(rects.insert(40, 10), None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,108 +2,368 @@
 
 import sys
 import os
-import glob
 import re
 import importlib
 import argparse
+import itertools
+import multiprocessing
+import json
+import time
+import traceback
 import yaml
+import profiler
+from tasks import run_tasks
 
 ICON_RE = re.compile('^(?:uni(?P<code>[0-9a-fA-F]+)_)?' +
                      '(?P<name>[a-zA-Z][a-zA-Z0-9\-]*)' +
                      '(?:_(?P<ext>[a-zA-Z\-]+))?\.svg$')
 
-# icons generator
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+# icon record. Known keys are stored in slots, keys set by third party
+# extensions go to extra dict. It supports dict methods used by extensions:
+# icon['name'], 'code' in icon, icon.get('svg'), iteration, items, update etc.
+class Icon(object):
+    __slots__ = ('file', 'name', 'code', 'dir', 'extensions', 'options', 'svg',
+                 'prepared', 'names', 'duplicate', 'extra')
+
+    def __init__(self, file, name, dir, extensions, code=None):
+        self.file = file
+        self.name = name
+        self.dir = dir
+        self.extensions = extensions
+        if code is not None: self.code = code
+        self.extra = None
+
+    def __getitem__(self, key):
+        if key in ICON_KEYS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        if self.extra is None: raise KeyError(key)
+        return self.extra[key]
+
+    def __setitem__(self, key, value):
+        if key in ICON_KEYS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None: self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key in ICON_KEYS:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        elif self.extra is None:
+            raise KeyError(key)
+        else:
+            del self.extra[key]
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def pop(self, key, *default):
+        try:
+            value = self[key]
+        except KeyError:
+            if default: return default[0]
+            raise
+        del self[key]
+        return value
+
+    def keys(self):
+        return [x for x in Icon.__slots__ if x in ICON_KEYS and x in self] + \
+               list(self.extra or ())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def iterkeys(self):
+        return iter(self.keys())
+
+    def values(self):
+        return [self[x] for x in self.keys()]
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def items(self):
+        return [(x, self[x]) for x in self.keys()]
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def setdefault(self, key, default=None):
+        if key not in self: self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).iteritems():
+            self[key] = value
+
+    def __repr__(self):
+        return '<Icon {0}>'.format(self.name)
+
+ICON_KEYS = frozenset(Icon.__slots__) - frozenset(['extra'])
+
+# directory listings by path and recursive flag: (mtime, [(name, is
+# directory), ...]). Listing is read again only when directory modification
+# time changes, so repeated scans in watch mode stat folders only
+_dir_index = {}
+
+# without scandir only entries which may be searched folders are checked
+# with stat: none in flat mode, names without .svg in recursive mode
+def list_dir(folder, recursive=False):
+    mtime = os.stat(folder).st_mtime
+    cached = _dir_index.get((folder, recursive))
+    if cached is not None and cached[0] == mtime: return cached[1]
+    if scandir is not None:
+        entries = [(x.name, x.is_dir()) for x in scandir(folder)]
+    else:
+        entries = [(x, recursive and not x.endswith('.svg') and
+                       os.path.isdir(os.path.join(folder, x)))
+                   for x in os.listdir(folder)]
+    entries.sort()
+    _dir_index[(folder, recursive)] = (mtime, entries)
+    return entries
+
+# svg files in icons folder with folder relative to icons-dir, subfolders
+# are searched in recursive mode
+def iter_svg_files(options, folder=None, subdir=''):
+    if folder is None: folder = options['icons-dir']
+    dirs = []
+    prefix = os.path.join(folder, '')
+    for name, is_dir in list_dir(folder, options['recursive']):
+        if is_dir:
+            dirs.append(name)
+        elif name.endswith('.svg'):
+            yield prefix + name, subdir
+    if not options['recursive']: return
+    for name in dirs:
+        for x in iter_svg_files(options, os.path.join(folder, name),
+                                os.path.join(subdir, name)):
+            yield x
+
+# icons generator. Icons with the same extensions share one frozenset
 def get_icons(options):
-    folder = options['icons-dir']
-    for svg_file in glob.iglob(os.path.join(folder, '*.svg')):
-        m = ICON_RE.match(svg_file.split('/')[-1])
+    extension_sets = {}
+    default = frozenset(options['default-extensions'])
+    for svg_file, subdir in iter_svg_files(options):
+        m = ICON_RE.match(os.path.basename(svg_file))
         if m is None: continue
-        icon = {
-            'file': svg_file,
-            'name': m.group('name'),
-            'extensions': set(options['default-extensions'])
-        }
-        if m.group('code'):
-            icon['code'] = int(m.group('code'), base=16)
-            icon['extensions'] |= set(['font', 'css', 'css_vars'])
-        if m.group('ext'):
-            icon['extensions'] |= set(m.group('ext').split('-'))
-        yield icon
+        code = m.group('code')
+        key = (code is not None, m.group('ext'))
+        extensions = extension_sets.get(key)
+        if extensions is None:
+            extensions = set(default)
+            if code is not None: extensions |= set(['font', 'css', 'css_vars'])
+            if m.group('ext'): extensions |= set(m.group('ext').split('-'))
+            extensions = extension_sets[key] = frozenset(extensions)
+        yield Icon(svg_file, m.group('name'), subdir, extensions,
+                   int(code, base=16) if code is not None else None)
+
+# icons of different subfolders with the same name, their css rules and
+# glyphs would overwrite each other. Returns error messages
+def check_names(options, icons):
+    if not options['recursive']: return []
+    files = {}
+    for icon in icons: files.setdefault(icon['name'], []).append(icon['file'])
+    return ['Icon name {0} is used by {1}'.format(name, ', '.join(sorted(x)))
+            for name, x in sorted(files.iteritems()) if len(x) > 1]
+
+# icon keys passed to prepare hooks in worker processes
+WORKER_KEYS = ('file', 'name', 'code', 'dir', 'extensions', 'duplicate')
+
+# worker process state, filled by init_worker
+_worker = {}
+
+def init_worker(options, names):
+    # library calls are profiled in workers and sent back with every icon,
+    # cProfile data of workers is not collected
+    if options['profile'] or options['profile-output'] is not None:
+        options['_profiler'] = profiler.Profiler()
+    _worker['options'] = options
+    _worker['extensions'] = dict(
+        (ext, importlib.import_module(ext + '_extension')) for ext in names)
+
+# runs extensions prepare hooks for icon in worker process. Results are
+# picklable and passed to process hooks as icon['prepared'][ext]. Returns
+# results with prepare time by extension and profiled library calls
+def prepare_icon(icon):
+    options = _worker['options']
+    extensions = _worker['extensions']
+    if options.get('_profiler') is not None: options['_profiler'].calls = {}
+    prepared = {}
+    timings = {}
+    for ext in icon['extensions']:
+        if hasattr(extensions[ext], 'prepare'):
+            started = time.time()
+            prepared[ext] = extensions[ext].prepare(options=options,
+                                                    icon=icon,
+                                                    extensions=extensions)
+            timings[ext] = time.time() - started
+    calls = options['_profiler'].calls if options.get('_profiler') else {}
+    return prepared, timings, calls
 
 
 # main options
-arg_parser = argparse.ArgumentParser(description='Make webfont from SVG icons.',
-                                     add_help=False)
-arg_parser.add_argument('-c', '--config',
-                        dest='config',
-                        help='config file location (default: search for' +
-                             ' .webfont.yml in current folder and user home)')
-arg_parser.add_argument('-d', '--work-dir',
-                        dest='work-dir', default='',
-                        help='project root path (default: config directory)')
-arg_parser.add_argument('-o', '--output-dir',
-                        dest='output-dir', default='',
-                        help='output folder relative to work-dir' +
-                             ' (default: work-dir itself)')
-arg_parser.add_argument('-i', '--icons-dir',
-                        dest='icons-dir', default='icons',
-                           help='icons path relative to work-dir (default: icons)')
-arg_parser.add_argument('-D', '--debug',
-                        dest='debug', default=False, action='store_true',
-                        help='print some debug info (default: False)')
-arg_parser.add_argument('-e', '--default-extensions',
-                        dest='default-extensions', default='svg',
-                        help='comma separated default extensions' +
-                             ' (default: "svg")')
-
-# parse main options and save unknown options for parsing in extensions
-options, extensions_args = arg_parser.parse_known_args()
-options = vars(options)
-
-if options['config'] is None:
-    options['config'] = os.path.join(os.getcwd(), '.webfont.yml')
-    if not os.path.isfile(options['config']):
-        options['config'] = os.path.join(os.path.expanduser('~'), '.webfont.yml')
-
-if not os.path.isfile(options['config']): options['config'] = None
-
-# load config file
-if options['config'] is not None:
-    stream = open(options['config'], 'r')
-    try:
-        config = yaml.load(stream)
-    except yaml.scanner.ScannerError as e:
-        print('Invalid config file: {0}'.format(e))
-        stream.close()
-        exit(1)
-    finally:
-        stream.close()
-    if 'config' in config:
-        if config['config'] is None: config['config'] = {}
-        options = dict(options.items() + config['config'].items())
-
-# basic options parsing
-config_dir = os.path.dirname(options['config']) \
-    if options['config'] is not None else os.path.expanduser('~')
-options['work-dir'] = os.path.join(config_dir, options['work-dir'])
-options['output-dir'] = os.path.join(options['work-dir'], options['output-dir'])
-options['icons-dir'] = os.path.join(options['work-dir'], options['icons-dir'])
-if not os.path.isdir(options['work-dir']):
-    arg_parser.error('Working directory {0} doen\'t exists'.format(options['work-dir']))
-if not os.path.isdir(options['icons-dir']):
-    arg_parser.error('Icons directory {0} doen\'t exists'.format(options['icons-dir']))
-if isinstance(options['default-extensions'], basestring):
-    options['default-extensions'] = re.split('\W+', options['default-extensions'])
-
-# add user extensions folders
-if options['debug']: print('Loading extensions. Options are: {0}'.format(options))
-options['root'] = os.path.abspath(os.path.dirname(__file__))
-if options['work-dir'] not in sys.path:
-    sys.path.insert(0, options['work-dir'])
+def make_parser():
+    arg_parser = argparse.ArgumentParser(description='Make webfont from SVG icons.',
+                                         add_help=False)
+    arg_parser.add_argument('-c', '--config',
+                            dest='config',
+                            help='config file location (default: search for' +
+                                 ' .webfont.yml in current folder and user home)')
+    arg_parser.add_argument('-d', '--work-dir',
+                            dest='work-dir', default='',
+                            help='project root path (default: config directory)')
+    arg_parser.add_argument('-o', '--output-dir',
+                            dest='output-dir', default='',
+                            help='output folder relative to work-dir' +
+                                 ' (default: work-dir itself)')
+    arg_parser.add_argument('-i', '--icons-dir',
+                            dest='icons-dir', default='icons',
+                               help='icons path relative to work-dir (default: icons)')
+    arg_parser.add_argument('-r', '--recursive',
+                            dest='recursive', default=False, action='store_true',
+                            help='search icons in icons-dir subfolders too' +
+                                 ' (default: False)')
+    arg_parser.add_argument('-D', '--debug',
+                            dest='debug', default=False, action='store_true',
+                            help='print some debug info (default: False)')
+    arg_parser.add_argument('-e', '--default-extensions',
+                            dest='default-extensions', default='svg',
+                            help='comma separated default extensions' +
+                                 ' (default: "svg")')
+    arg_parser.add_argument('-j', '--jobs',
+                            dest='jobs', default=1, type=int,
+                            help='number of worker processes for icons' +
+                                 ' processing (default: 1)')
+    arg_parser.add_argument('-b', '--batch-size',
+                            dest='batch-size', default=0, type=int,
+                            help='process icons in batches of given size and' +
+                                 ' release rendered icon data after each icon' +
+                                 ' to bound memory use (default: all icons at once)')
+    arg_parser.add_argument('-T', '--timings',
+                            dest='timings',
+                            help='write build phases timings into JSON file' +
+                                 ' (default: not written)')
+    arg_parser.add_argument('-P', '--profile',
+                            dest='profile', default=False, action='store_true',
+                            help='print extension hooks and library calls' +
+                                 ' timings report (default: False)')
+    arg_parser.add_argument('--profile-top',
+                            dest='profile-top', default=10, type=int,
+                            help='number of slowest icons per extension' +
+                                 ' in profile report (default: 10)')
+    arg_parser.add_argument('--profile-output',
+                            dest='profile-output',
+                            help='collect cProfile data and save it into' +
+                                 ' file (default: not collected)')
+    arg_parser.add_argument('-W', '--watch',
+                            dest='watch', default=False, action='store_true',
+                            help='watch icons and config for changes and' +
+                                 ' rebuild incrementally (default: False)')
+    arg_parser.add_argument('--watch-interval',
+                            dest='watch-interval', default=1.0, type=float,
+                            help='polling interval in seconds when inotify' +
+                                 ' is not available (default: 1)')
+    return arg_parser
 
-try:
-    icons = list(get_icons(options))
+def load_options(argv):
+    arg_parser = make_parser()
+
+    # parse main options and save unknown options for parsing in extensions
+    options, extensions_args = arg_parser.parse_known_args(argv)
+    options = vars(options)
+
+    if options['config'] is None:
+        options['config'] = os.path.join(os.getcwd(), '.webfont.yml')
+        if not os.path.isfile(options['config']):
+            options['config'] = os.path.join(os.path.expanduser('~'), '.webfont.yml')
+
+    if not os.path.isfile(options['config']): options['config'] = None
+
+    # load config file
+    if options['config'] is not None:
+        stream = open(options['config'], 'r')
+        try:
+            config = yaml.load(stream)
+        except yaml.scanner.ScannerError as e:
+            print('Invalid config file: {0}'.format(e))
+            stream.close()
+            exit(1)
+        finally:
+            stream.close()
+        if 'config' in config:
+            if config['config'] is None: config['config'] = {}
+            options = dict(options.items() + config['config'].items())
 
+    # basic options parsing
+    config_dir = os.path.dirname(options['config']) \
+        if options['config'] is not None else os.path.expanduser('~')
+    options['work-dir'] = os.path.join(config_dir, options['work-dir'])
+    options['output-dir'] = os.path.join(options['work-dir'], options['output-dir'])
+    options['icons-dir'] = os.path.join(options['work-dir'], options['icons-dir'])
+    if not os.path.isdir(options['work-dir']):
+        arg_parser.error('Working directory {0} doen\'t exists'.format(options['work-dir']))
+    if not os.path.isdir(options['icons-dir']):
+        arg_parser.error('Icons directory {0} doen\'t exists'.format(options['icons-dir']))
+    if isinstance(options['default-extensions'], basestring):
+        options['default-extensions'] = re.split('\W+', options['default-extensions'])
+    options['jobs'] = max(1, int(options['jobs']))
+    # daemonic workers of batch builds can't start worker processes
+    if multiprocessing.current_process().daemon: options['jobs'] = 1
+    options['batch-size'] = max(0, int(options['batch-size']))
+    options['_profiler'] = None
+    if options['profile'] or options['profile-output'] is not None:
+        options['_profiler'] = profiler.Profiler(
+            top=int(options['profile-top']),
+            cprofile=options['profile-output'] is not None)
+
+    # add user extensions folders
+    if options['debug']: print('Loading extensions. Options are: {0}'.format(options))
+    options['root'] = os.path.abspath(os.path.dirname(__file__))
+    if options['work-dir'] not in sys.path:
+        sys.path.insert(0, options['work-dir'])
+
+    return options, extensions_args, arg_parser
+
+# extensions in dependency order: every extension goes after extensions listed
+# in its REQUIRES
+def ordered(extensions):
+    names = []
+    def visit(name, path):
+        if name in names or name not in extensions: return
+        for dep in getattr(extensions[name], 'REQUIRES', []):
+            if dep not in path: visit(dep, path + [name])
+        names.append(name)
+    for name in sorted(extensions): visit(name, [])
+    return names
+
+def load_extensions(options, extensions_args, arg_parser, icons):
     # import extension list
     extensions = dict(
         (ext, importlib.import_module(ext + '_extension')) \
@@ -111,43 +371,358 @@ try:
     )
 
     # get extensions options
-    for ext in extensions.values():
-        if hasattr(ext, 'get_options'):
-            ext.get_options(arg_parser)
+    for name in ordered(extensions):
+        call_hook(options, extensions, name, 'get_options', (arg_parser,))
 
     # parse unknown options for extensions
     options = dict(vars(arg_parser.parse_args(extensions_args)).items() +
                    options.items())
 
     # ext-specific options parsing
-    for ext in extensions.values():
-        if hasattr(ext, 'parse_options'):
-            ext.parse_options(options, arg_parser)
+    for name in ordered(extensions):
+        call_hook(options, extensions, name, 'parse_options',
+                  (options, arg_parser))
 
     if options['debug']:
         print('Extensions loaded. Options are: {0}'.format(options))
 
-    # initialize extensions
-    for ext in extensions.values():
-        if hasattr(ext, 'init'):
-            ext.init(options=options,
-                     icons=icons,
-                     extensions=extensions)
+    return options, extensions
+
+# adds time passed from started to options['_timings'][phase][name]
+def add_timing(options, phase, name, started):
+    timings = options['_timings'].setdefault(phase, {})
+    timings[name] = timings.get(name, 0.0) + time.time() - started
+
+# calls extension hook if it is defined, collects timings
+def call_hook(options, extensions, name, hook, args=(), kwargs={}):
+    if not hasattr(extensions[name], hook): return
+    started = time.time()
+    fn = getattr(extensions[name], hook)
+    if options['_profiler'] is not None:
+        result = options['_profiler'].call(name, hook, fn, *args, **kwargs)
+    else:
+        result = fn(*args, **kwargs)
+    if '_timings' in options: add_timing(options, hook, name, started)
+    return result
+
+def write_profile(options):
+    if options['_profiler'] is None: return
+    if options['profile']: print(options['_profiler'].report())
+    if options['profile-output'] is not None:
+        options['_profiler'].dump_stats(options['profile-output'])
+
+def write_timings(options):
+    if options['timings'] is None: return
+    with open(options['timings'], 'w') as f:
+        json.dump(options['_timings'], f, indent=2, sort_keys=True)
+
+def init_extensions(options, icons, extensions):
+    for name in ordered(extensions):
+        call_hook(options, extensions, name, 'init',
+                  kwargs=dict(options=options,
+                              icons=icons,
+                              extensions=extensions))
+
+# heavy per-icon state: parsed SVG document and prepare hooks results
+RELEASE_KEYS = ('svg', 'prepared')
 
-    # iterate through icons
+def process_icons(options, icons, extensions):
+    pool = None
+    try:
+        # run prepare hooks in worker processes, only public options are passed
+        if options['jobs'] > 1 and len(icons) > 1:
+            pool = multiprocessing.Pool(
+                options['jobs'],
+                initializer=init_worker,
+                initargs=(dict((k, v) for k, v in options.iteritems()
+                               if not k.startswith('_')),
+                          extensions.keys()))
+
+        # in batch mode only one batch is prepared at a time and icons keep
+        # only compact metadata after processing
+        order = ordered(extensions)
+        hooks = {}
+        size = options['batch-size'] or max(1, len(icons))
+        for start in range(0, len(icons), size):
+            batch = icons[start:start + size]
+            if pool is not None:
+                prepared = pool.imap(prepare_icon,
+                                     [dict((k, icon[k]) for k in WORKER_KEYS
+                                           if k in icon) for icon in batch],
+                                     max(1, len(batch) // (options['jobs'] * 4)))
+            else:
+                prepared = itertools.repeat(None)
+
+            # iterate through icons
+            for icon in batch:
+                started = time.time()
+                data = next(prepared)
+                if data is not None:
+                    icon['prepared'], timings, calls = data
+                    add_timing(options, 'prepare', 'wait', started)
+                    if options['_profiler'] is not None:
+                        options['_profiler'].add_prepared(icon['name'],
+                                                          timings, calls)
+                icon['options'] = options
+                # icons share interned extension sets, so hooks order is
+                # computed once per set
+                names = hooks.get(icon['extensions'])
+                if names is None:
+                    names = hooks[icon['extensions']] = \
+                        [x for x in order if x in icon['extensions']]
+                for name in names:
+                    call_hook(options, extensions, name, 'process',
+                              kwargs=dict(options=options,
+                                          icon=icon,
+                                          extensions=extensions))
+                if options['batch-size']:
+                    for key in RELEASE_KEYS: icon.pop(key, None)
+
+        if pool is not None:
+            pool.close()
+            pool.join()
+            pool = None
+    finally:
+        if pool is not None: pool.terminate()
+
+def remove_icons(options, icons, extensions):
     for icon in icons:
-        icon['options'] = options
-        for ext in icon['extensions']:
-            extensions[ext].process(options=options,
-                                    icon=icon,
-                                    extensions=extensions)
-
-    # extensions teardown
-    for ext in extensions.values():
-        if hasattr(ext, 'finish'):
-            ext.finish(options=options,
-                       icons=icons,
-                       extensions=extensions)
-
-finally:
-    None
+        for name in icon['extensions']:
+            call_hook(options, extensions, name, 'remove',
+                      kwargs=dict(options=options,
+                                  icon=icon,
+                                  extensions=extensions))
+
+def finish_extensions(options, icons, extensions):
+    for name in ordered(extensions):
+        call_hook(options, extensions, name, 'finish',
+                  kwargs=dict(options=options,
+                              icons=icons,
+                              extensions=extensions))
+
+def close_extensions(options, extensions):
+    for name in ordered(extensions):
+        call_hook(options, extensions, name, 'close',
+                  kwargs=dict(options=options,
+                              extensions=extensions))
+
+def run(argv):
+    started = time.time()
+    options, extensions_args, arg_parser = load_options(argv)
+    icons = list(get_icons(options))
+    errors = check_names(options, icons)
+    if errors: arg_parser.error('\n'.join(errors))
+    discovery = time.time() - started
+    options, extensions = load_extensions(options, extensions_args,
+                                          arg_parser, icons)
+    options['_timings'] = { 'discovery': discovery }
+    # files written by extensions in finish hooks
+    options['_outputs'] = []
+    options['_started'] = started
+    # failed build closes extensions, so fonts are not leaked by build()
+    try:
+        init_extensions(options, icons, extensions)
+        process_icons(options, icons, extensions)
+        finish_extensions(options, icons, extensions)
+        options['_timings']['total'] = time.time() - started
+        write_timings(options)
+        write_profile(options)
+    except:
+        close_extensions(options, extensions)
+        raise
+    return options, icons, extensions
+
+# builds project in-process, returns icons count and build timings. Extra
+# args are command line options. Extensions loaded from project work-dir are
+# unloaded after build, so projects don't share them
+def build(config, args=()):
+    if not os.path.isfile(config):
+        raise IOError('Config file {0} not found'.format(config))
+    root = os.path.abspath(os.path.dirname(__file__))
+    path = list(sys.path)
+    modules = set(sys.modules)
+    try:
+        options, icons, extensions = run(['-c', config] + list(args))
+        close_extensions(options, extensions)
+    finally:
+        sys.path[:] = path
+        for name in set(sys.modules) - modules:
+            module = sys.modules[name]
+            if name.endswith('_extension') and hasattr(module, '__file__') and \
+               os.path.dirname(os.path.abspath(module.__file__)) != root:
+                del sys.modules[name]
+    return { 'icons': len(icons), 'timings': options['_timings'] }
+
+# batch mode
+
+# builds one project of batch in worker process, errors are reported in
+# result instead of raising
+def build_project(task):
+    config, args = task
+    result = { 'config': config, 'status': 'ok' }
+    started = time.time()
+    try:
+        result.update(build(config, args))
+    except (Exception, SystemExit) as e:
+        result['status'] = 'failed'
+        result['error'] = traceback.format_exc() \
+            if isinstance(e, Exception) else 'exit code {0}'.format(e.code)
+    result['time'] = time.time() - started
+    return result
+
+# builds many projects on pool of warm worker processes: fontforge and other
+# modules are imported once per worker. Options after "--" are passed to
+# every build. Returns exit code
+def batch(argv):
+    build_args = []
+    if '--' in argv:
+        build_args = argv[argv.index('--') + 1:]
+        argv = argv[:argv.index('--')]
+    parser = argparse.ArgumentParser(prog='webfont.py batch',
+                                     description='Build many webfont projects.')
+    parser.add_argument('configs', nargs='+',
+                        help='config files of projects')
+    parser.add_argument('-j', '--jobs',
+                        dest='jobs', default=multiprocessing.cpu_count(), type=int,
+                        help='number of projects built in parallel, every' +
+                             ' project is built with one process' +
+                             ' (default: number of CPUs)')
+    parser.add_argument('-s', '--summary',
+                        dest='summary',
+                        help='write build results into JSON file' +
+                             ' (default: not written)')
+    options = vars(parser.parse_args(argv))
+
+    started = time.time()
+    tasks = [(os.path.abspath(x), build_args) for x in options['configs']]
+    results = run_tasks(build_project, tasks, options['jobs'], 1)
+
+    print('')
+    for result in results:
+        print('{0:<7} {1:>8.2f}s {2:>6} icons  {3}'.format(
+            result['status'], result['time'], result.get('icons', '-'),
+            result['config']))
+    failed = [x for x in results if x['status'] != 'ok']
+    for result in failed:
+        print('\n{0}:\n{1}'.format(result['config'], result['error']))
+    print('{0} projects, {1} failed, {2:.2f}s'.format(
+        len(results), len(failed), time.time() - started))
+    if options['summary'] is not None:
+        with open(options['summary'], 'w') as f:
+            json.dump({
+                'time': time.time() - started,
+                'projects': results
+            }, f, indent=2, sort_keys=True)
+    return 1 if failed else 0
+
+# watch mode
+
+# icon files and config modification state
+def snapshot(options):
+    state = {}
+    for path in [options['config']] + \
+                [x for x, subdir in iter_svg_files(options)]:
+        if path is None: continue
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        state[path] = (st.st_mtime, st.st_size)
+    return state
+
+# waits for file system events with inotify if pyinotify is installed,
+# otherwise just sleeps for polling interval
+class Watcher(object):
+    def __init__(self, options):
+        self.interval = options['watch-interval']
+        self.notifier = None
+        try:
+            import pyinotify
+        except ImportError:
+            return
+        manager = pyinotify.WatchManager()
+        mask = pyinotify.IN_CLOSE_WRITE | pyinotify.IN_CREATE | \
+               pyinotify.IN_DELETE | pyinotify.IN_MOVED_TO | \
+               pyinotify.IN_MOVED_FROM | pyinotify.IN_ATTRIB
+        manager.add_watch(options['icons-dir'], mask,
+                          rec=options['recursive'], auto_add=options['recursive'])
+        if options['config'] is not None:
+            manager.add_watch(os.path.dirname(options['config']), mask)
+        self.notifier = pyinotify.Notifier(manager, lambda event: None)
+
+    def wait(self):
+        if self.notifier is None:
+            time.sleep(self.interval)
+            return
+        if self.notifier.check_events(timeout=None):
+            # let editors finish writing and collect all pending events
+            time.sleep(0.1)
+            while True:
+                self.notifier.read_events()
+                self.notifier.process_events()
+                if not self.notifier.check_events(timeout=0): break
+
+    def close(self):
+        if self.notifier is not None: self.notifier.stop()
+
+def watch(argv, options, icons, extensions):
+    while True:
+        state = snapshot(options)
+        reported = []
+        watcher = Watcher(options)
+        print('Watching {0} for changes'.format(options['icons-dir']))
+        try:
+            while True:
+                watcher.wait()
+                current = snapshot(options)
+                if current == state: continue
+                if options['config'] is not None and \
+                   current.get(options['config']) != state.get(options['config']):
+                    print('Config changed, rebuilding')
+                    break
+                changed = set(path for path in set(state) | set(current)
+                              if state.get(path) != current.get(path))
+                new_icons = list(get_icons(options))
+                # changes are collected until names are fixed, every error
+                # is printed once
+                errors = check_names(options, new_icons)
+                if errors:
+                    if errors != reported: print('\n'.join(errors))
+                    reported = errors
+                    continue
+                reported = []
+                state = current
+                # new extensions require full rebuild
+                if not reduce(lambda a, x: a | x['extensions'],
+                              new_icons, set()) <= set(extensions):
+                    print('New extensions found, rebuilding')
+                    break
+                remove_icons(options,
+                             [x for x in icons if x['file'] in changed],
+                             extensions)
+                icons = [x for x in icons if x['file'] not in changed] + \
+                        [x for x in new_icons if x['file'] in changed]
+                print('Rebuilding {0} changed icons'.format(len(changed)))
+                started = time.time()
+                options['_timings'] = {}
+                options['_outputs'] = []
+                options['_started'] = started
+                process_icons(options,
+                              [x for x in icons if x['file'] in changed],
+                              extensions)
+                finish_extensions(options, icons, extensions)
+                options['_timings']['total'] = time.time() - started
+                write_timings(options)
+                write_profile(options)
+        finally:
+            watcher.close()
+        close_extensions(options, extensions)
+        options, icons, extensions = run(argv)
+
+if __name__ == '__main__':
+    try:
+        if sys.argv[1:2] == ['batch']: exit(batch(sys.argv[2:]))
+        options, icons, extensions = run(sys.argv[1:])
+        if options['watch']: watch(sys.argv[1:], options, icons, extensions)
+    except KeyboardInterrupt:
+        pass